@@ -0,0 +1,254 @@
+"""
+Offline benchmarks for the NationStates command handlers.
+
+Every API call is answered from the synthetic fixtures in ``fixtures.py``
+by a stand-in for ``sans.Api``, and commands are driven against a fake
+context, so nothing touches the network or Discord. Needs the cog's own
+requirements (Red-DiscordBot, sans) installed, and runs on the same Pythons
+as CI, 3.6 and up; 3.6 also needs the ``dataclasses`` backport.
+
+Run from the repository root:
+
+    python benchmarks/bench_nationstates.py [-n ITERATIONS] [--warm] [--output FILE] [case ...]
+
+Each case is timed over ITERATIONS runs, then run again under tracemalloc
+to report the peak memory of a single run. By default every cache is emptied
+before each run so the full fetch, parse and render path is measured;
+``--warm`` keeps them, which measures the cached path instead.
+"""
+import argparse
+import asyncio
+import importlib
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+from lxml import objectify
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+# Red installs shared libraries under cog_shared; mirror that for a plain checkout
+sys.modules.setdefault("cog_shared", types.ModuleType("cog_shared"))
+sys.modules["cog_shared.proxyembed"] = importlib.import_module("proxyembed")
+
+from fixtures import NATION, REGION, Fixtures  # noqa: E402
+from nationstates import nationstates as ns  # noqa: E402
+from nationstates.cache import request_key  # noqa: E402
+from nationstates.dbid import DBIDStore  # noqa: E402
+from nationstates.resolutions import ResolutionIndex  # noqa: E402
+from nationstates.scheduler import Scheduler  # noqa: E402
+
+
+FIXTURES = Fixtures()
+
+
+def respond(*shards, **kwargs) -> bytes:
+    """Picks the fixture for a request, the way the live API would route it."""
+    query, params = request_key(*shards, **kwargs)
+    params = dict(params)
+    if "cardid" in params:
+        return FIXTURES.card(int(params["cardid"]), int(params.get("season", 2)))
+    if "wa" in params:
+        if "members" in query:
+            return FIXTURES.wa_members()
+        return FIXTURES.resolution(int(params["wa"]))
+    if "nation" in params:
+        return FIXTURES.nation(params["nation"])
+    if "region" in params:
+        if "nations" in query:
+            return FIXTURES.region_nations(params["region"])
+        return FIXTURES.region(params["region"])
+    raise ValueError(f"No fixture for {query!r} {params!r}")
+
+
+class FakeApi:
+    """Stands in for sans.Api: awaiting it parses a fixture instead of making a request."""
+
+    agent = "benchmarks"
+    loop = None
+    xra = None
+
+    def __init__(self, *shards, **kwargs):
+        self.shards = shards
+        self.kwargs = kwargs
+
+    def __await__(self):
+        return self._parse().__await__()
+
+    async def _parse(self):
+        return objectify.fromstring(respond(*self.shards, **self.kwargs))
+
+
+class FakeContent:
+    def __init__(self, data: bytes):
+        self._data = data
+
+    async def iter_chunked(self, size: int):
+        for i in range(0, len(self._data), size):
+            yield self._data[i : i + size]
+
+
+class FakeResponse:
+    status = 200
+    reason = "OK"
+
+    def __init__(self, data: bytes):
+        self.content = FakeContent(data)
+
+    def raise_for_status(self):
+        pass
+
+    def release(self):
+        pass
+
+
+class FakeSession:
+    async def get(self, url, *, params, headers=None):
+        return FakeResponse(respond(**params))
+
+    async def close(self):
+        pass
+
+
+class FakeBot:
+    def __init__(self, loop):
+        self.loop = loop
+        self.owner_id = 1
+
+    def dispatch(self, event, *args):
+        pass
+
+
+class FakeMessage:
+    id = 1
+    created_at = datetime(2020, 1, 1)
+
+
+class FakeContext:
+    """Just enough of a command context for the handlers; output is thrown away."""
+
+    clean_prefix = "[p]"
+    message = FakeMessage()
+
+    def __init__(self, invoked_with: str):
+        self.invoked_with = invoked_with
+        self.sent = 0
+
+    async def send(self, content=None, **kwargs):
+        self.sent += 1
+
+    async def send_interactive(self, messages, box_lang=None, timeout=15):
+        for _ in messages:
+            self.sent += 1
+
+    async def embed_requested(self):
+        return True
+
+    async def embed_colour(self):
+        return 0x8BBC21
+
+    async def tick(self):
+        pass
+
+
+def make_cog(loop, data: Path) -> "ns.NationStates":
+    with mock.patch.object(ns, "Config"):
+        cog = ns.NationStates(FakeBot(loop))
+    # nothing here should wait on the real rate limit
+    cog.scheduler = Scheduler(limit=1 << 30, period=1, reserve=0)
+    cog.session = FakeSession()
+    cog.dbids = DBIDStore(data / "dbids.sqlite3")
+    cog.dbids.open()
+    cog.resolutions = ResolutionIndex(data / "resolutions.sqlite3")
+    cog.resolutions.open()
+    return cog
+
+
+def reset(cog):
+    cog.cache.clear()
+    cog.rendered.clear()
+    cog.index.wa_members = None
+    cog.index._regions.clear()
+
+
+CASES = {
+    "nation": lambda cog, ctx: cog.nation.callback(cog, ctx, nations=[NATION]),
+    "region": lambda cog, ctx: cog.region.callback(cog, ctx, regions=[REGION]),
+    "card": lambda cog, ctx: cog.card.callback(cog, ctx, 2, nation=1),
+    "wa": lambda cog, ctx: cog.wa.callback(cog, ctx, None),
+    "wa-delegates": lambda cog, ctx: cog.wa.callback(cog, ctx, None, ns.WA.DELEGATE),
+    "nne": lambda cog, ctx: cog.nne.callback(cog, ctx, wa_nation=NATION),
+    "nnec": lambda cog, ctx: cog.nnec.callback(cog, ctx, wa_nation=NATION),
+}
+
+
+async def bench(cog, name: str, iterations: int, warm: bool) -> str:
+    case = CASES[name]
+    ctx = FakeContext("ga" if name.startswith("wa") else name)
+    # one untimed run to settle imports and lazily built state
+    reset(cog)
+    await case(cog, ctx)
+    elapsed = 0.0
+    for _ in range(iterations):
+        if not warm:
+            reset(cog)
+        start = time.perf_counter()
+        await case(cog, ctx)
+        elapsed += time.perf_counter() - start
+    peak = 0
+    for _ in range(max(1, iterations // 10)):
+        if not warm:
+            reset(cog)
+        # restarted for each run, since tracemalloc.reset_peak needs Python 3.9
+        tracemalloc.start()
+        try:
+            await case(cog, ctx)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    return "{:<14} {:>10.1f} {:>10.3f} {:>12.1f}".format(
+        name, iterations / elapsed, 1000 * elapsed / iterations, peak / 1024
+    )
+
+
+async def main(args):
+    loop = asyncio.get_event_loop()
+    with tempfile.TemporaryDirectory() as data, mock.patch.object(ns, "Api", FakeApi):
+        cog = make_cog(loop, Path(data))
+        try:
+            # what the background prefetch would have in memory
+            await cog.at_vote.refresh(1)
+            await cog.at_vote.refresh(2)
+            lines = [
+                "{} cache, {} iterations".format("warm" if args.warm else "cold", args.iterations),
+                "{:<14} {:>10} {:>10} {:>12}".format("case", "ops/s", "ms/op", "peak KiB"),
+            ]
+            print(*lines, sep="\n")
+            for name in args.cases or CASES:
+                line = await bench(cog, name, args.iterations, args.warm)
+                print(line)
+                lines.append(line)
+        finally:
+            cog.cog_unload()
+    if args.output:
+        Path(args.output).write_text("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("cases", nargs="*", metavar="case", help=", ".join(CASES))
+    parser.add_argument("-n", "--iterations", type=int, default=50)
+    parser.add_argument("--warm", action="store_true", help="keep caches between runs")
+    parser.add_argument("--output", help="also write the results to this file")
+    args = parser.parse_args()
+    unknown = set(args.cases).difference(CASES)
+    if unknown:
+        parser.error("unknown cases: " + ", ".join(sorted(unknown)))
+    asyncio.get_event_loop().run_until_complete(main(args))
@@ -0,0 +1,147 @@
+"""
+Synthetic NationStates API responses, shaped like the real ones.
+
+Everything is generated from a fixed seed, so runs are comparable.
+Sizes default to the large end of what the live site returns.
+
+These stand in for recorded responses on purpose: recordings of this size
+would add tens of megabytes to the repository, go stale as the site changes,
+and couldn't be scaled up or down to see how a handler grows.
+"""
+import random
+from typing import List
+from xml.sax.saxutils import escape
+
+SEED = 2_113_674_295
+REGION_SIZE = 20_000
+WA_MEMBERS = 30_000
+ENDORSEMENTS = 2_500
+MARKET_ORDERS = 400
+DELEGATE_VOTES = 1_000
+
+NATION = "testlandia"
+REGION = "the_north_pacific"
+
+
+def _names(prefix: str, count: int) -> List[str]:
+    return [f"{prefix}_{i}" for i in range(count)]
+
+
+class Fixtures:
+    def __init__(
+        self,
+        *,
+        region_size: int = REGION_SIZE,
+        wa_members: int = WA_MEMBERS,
+        endorsements: int = ENDORSEMENTS,
+        market_orders: int = MARKET_ORDERS,
+        delegate_votes: int = DELEGATE_VOTES,
+    ):
+        rng = random.Random(SEED)
+        self.residents = _names("resident", region_size)
+        # about a third of the region is in the WA; the rest of the members live elsewhere
+        resident_members = rng.sample(self.residents, min(region_size // 3, wa_members))
+        self.members = resident_members + _names("member", wa_members - len(resident_members))
+        rng.shuffle(self.members)
+        self.endorsers = rng.sample(resident_members, min(endorsements, len(resident_members)))
+        self.orders = [
+            (rng.choice(("bid", "ask")), round(rng.uniform(0.01, 50), 2), f"trader_{i}")
+            for i in range(market_orders)
+        ]
+        self.delvotes = {
+            side: [(f"delegate_{side}_{i}", rng.randint(1, 800)) for i in range(delegate_votes)]
+            for side in ("FOR", "AGAINST")
+        }
+
+    def nation(self, nation: str = NATION) -> bytes:
+        return f"""<NATION id="{nation}">
+<NAME>{nation.replace("_", " ").title()}</NAME>
+<FULLNAME>The Republic of {nation.replace("_", " ").title()}</FULLNAME>
+<MOTTO>Benchmarks are forever</MOTTO>
+<CATEGORY>Inoffensive Centrist Democracy</CATEGORY>
+<UNSTATUS>WA Delegate</UNSTATUS>
+<ENDORSEMENTS>{",".join(self.endorsers)}</ENDORSEMENTS>
+<FREEDOM><CIVILRIGHTS>Good</CIVILRIGHTS><ECONOMY>Strong</ECONOMY><POLITICALFREEDOM>Good</POLITICALFREEDOM></FREEDOM>
+<REGION>{REGION.replace("_", " ").title()}</REGION>
+<POPULATION>12345</POPULATION>
+<DEMONYM2PLURAL>Testlandians</DEMONYM2PLURAL>
+<FLAG>https://www.nationstates.net/images/flags/uploads/testlandia.png</FLAG>
+<FOUNDED>0</FOUNDED>
+<LASTLOGIN>1600000000</LASTLOGIN>
+<INFLUENCE>Eminence Grise</INFLUENCE>
+<DBID>1</DBID>
+<CENSUS>
+<SCALE id="65"><SCORE>12345.00</SCORE></SCALE>
+<SCALE id="66"><SCORE>{len(self.endorsers)}.00</SCORE></SCALE>
+</CENSUS>
+</NATION>""".encode()
+
+    def region(self, region: str = REGION) -> bytes:
+        return f"""<REGION id="{region}">
+<NAME>{region.replace("_", " ").title()}</NAME>
+<NUMNATIONS>{len(self.residents)}</NUMNATIONS>
+<DELEGATE>{NATION}</DELEGATE>
+<DELEGATEVOTES>{len(self.endorsers) + 1}</DELEGATEVOTES>
+<DELEGATEAUTH>XABCEP</DELEGATEAUTH>
+<FLAG></FLAG>
+<FOUNDED>0</FOUNDED>
+<FOUNDER>0</FOUNDER>
+<FOUNDERAUTH></FOUNDERAUTH>
+<LASTUPDATE>1600000000</LASTUPDATE>
+<POWER>Extremely High</POWER>
+<TAGS><TAG>Feeder</TAG><TAG>Huge</TAG><TAG>Founderless</TAG></TAGS>
+</REGION>""".encode()
+
+    def region_nations(self, region: str = REGION) -> bytes:
+        return f'<REGION id="{region}"><NATIONS>{":".join(self.residents)}</NATIONS></REGION>'.encode()
+
+    def wa_members(self) -> bytes:
+        return f'<WA council="1"><MEMBERS>{",".join(self.members)}</MEMBERS></WA>'.encode()
+
+    def card(self, card_id: int = 1, season: int = 2) -> bytes:
+        markets = "".join(
+            f"<MARKET><NATION>{name}</NATION><PRICE>{price:.2f}</PRICE>"
+            f"<TIMESTAMP>1600000000</TIMESTAMP><TYPE>{kind}</TYPE></MARKET>"
+            for kind, price, name in self.orders
+        )
+        return f"""<CARD id="{card_id}">
+<CARDID>{card_id}</CARDID>
+<CATEGORY>legendary</CATEGORY>
+<FLAG>uploads/testlandia.png</FLAG>
+<MARKET_VALUE>25.00</MARKET_VALUE>
+<NAME>Testlandia</NAME>
+<REGION>{REGION.replace("_", " ").title()}</REGION>
+<SEASON>{season}</SEASON>
+<TYPE>Republic</TYPE>
+<MARKETS>{markets}</MARKETS>
+</CARD>""".encode()
+
+    def resolution(self, council: int = 1) -> bytes:
+        delvotes = "".join(
+            f"<DELVOTES_{side}>"
+            + "".join(
+                f"<DELEGATE><NATION>{name}</NATION><VOTES>{votes}</VOTES>"
+                f"<TIMESTAMP>1600000000</TIMESTAMP></DELEGATE>"
+                for name, votes in entries
+            )
+            + f"</DELVOTES_{side}>"
+            for side, entries in self.delvotes.items()
+        )
+        desc = escape("[b]Noting[/b] that benchmarks should be repeatable,\n" * 200)
+        return f"""<WA council="{council}">
+<RESOLUTION>
+<CATEGORY>Regulation</CATEGORY>
+<CREATED>1600000000</CREATED>
+<DESC>{desc}</DESC>
+<NAME>Repeatable Benchmarks Act</NAME>
+<OPTION>Consumer Protection</OPTION>
+<PROMOTED>1600000000</PROMOTED>
+<PROPOSED_BY>{NATION}</PROPOSED_BY>
+<TOTAL_NATIONS_AGAINST>1234</TOTAL_NATIONS_AGAINST>
+<TOTAL_NATIONS_FOR>5678</TOTAL_NATIONS_FOR>
+<TOTAL_VOTES_AGAINST>4321</TOTAL_VOTES_AGAINST>
+<TOTAL_VOTES_FOR>8765</TOTAL_VOTES_FOR>
+{delvotes}
+</RESOLUTION>
+<LASTRESOLUTION>The last resolution passed.</LASTRESOLUTION>
+</WA>""".encode()
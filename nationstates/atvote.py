@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional
+
+# pylint: disable=E0611
+from sans.errors import NotFound
+
+from .periodic import PeriodicTask
+
+
+log = logging.getLogger("red.fluffy.nationstates.atvote")
+
+COUNCILS = (1, 2)
+
+
+class AtVote(NamedTuple):
+    root: object  # the <WA> response, with resolution, lastresolution and delvotes
+    author: Optional[dict]
+    taken: float
+
+    @property
+    def proposer(self) -> Optional[str]:
+        return self.root.findtext("RESOLUTION/PROPOSED_BY")
+
+
+class AtVoteWatcher(PeriodicTask):
+    """
+    Keeps each council's at-vote resolution, delegate votes and proposer in memory.
+
+    A snapshot older than twice the interval is treated as missing,
+    so a stalled refresh never serves a vote that's long over.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[..., Awaitable],
+        *,
+        interval: float = 60,
+        observe: Optional[Callable[[int, object], None]] = None,
+    ):
+        super().__init__(interval)
+        self._fetch = fetch
+        self._observe = observe
+        self.current: Dict[int, AtVote] = {}
+
+    def get(self, council: int) -> Optional[AtVote]:
+        snapshot = self.current.get(council)
+        if snapshot and time.monotonic() - snapshot.taken < 2 * self.interval:
+            return snapshot
+        return None
+
+    async def refresh(self, council: int):
+        root = await self._fetch({"wa": str(council)}, q="resolution lastresolution delvotes")
+        proposer = root.findtext("RESOLUTION/PROPOSED_BY")
+        previous = self.current.get(council)
+        if not proposer:
+            author = None
+        elif previous and previous.proposer == proposer:
+            # the proposer can't change for the life of a vote
+            author = previous.author
+        else:
+            try:
+                nation = await self._fetch("fullname flag", nation=proposer)
+            except NotFound:
+                author = None
+            else:
+                author = {"fullname": nation.FULLNAME.text, "flag": nation.FLAG.text}
+        self.current[council] = AtVote(root, author, time.monotonic())
+        if self._observe:
+            self._observe(council, root)
+
+    async def tick(self):
+        for council in COUNCILS:
+            try:
+                await self.refresh(council)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Failed to refresh the at-vote resolution of council %s", council)
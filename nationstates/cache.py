@@ -0,0 +1,154 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Hashable, Optional, Tuple
+
+
+# seconds each shard stays fresh; a request lives as long as its most volatile shard
+SHARD_TTLS = {
+    # changes minute to minute
+    "lastlogin": 60,
+    "endorsements": 60,
+    "zombie": 60,
+    "markets": 60,
+    "delvotes": 60,
+    "resolution": 60,
+    # changes a few times a day at most
+    "census": 300,
+    "influence": 300,
+    "wa": 300,
+    "members": 300,
+    "nations": 300,
+    "numnations": 300,
+    "delegate": 300,
+    "delegatevotes": 300,
+    "delegateauth": 300,
+    "lastresolution": 300,
+    "cards": 300,
+    "info": 300,
+    "lastupdate": 300,
+    "power": 300,
+    "population": 300,
+    "freedom": 900,
+    "category": 900,
+    "tags": 900,
+    "region": 900,
+    # effectively static
+    "flag": 3600,
+    "fullname": 3600,
+    "motto": 3600,
+    "demonym2plural": 3600,
+    "founderauth": 3600,
+    "name": 86400,
+    "founded": 86400,
+    "founder": 86400,
+    "dbid": 86400,
+}
+DEFAULT_TTL = 60
+
+Key = Tuple[FrozenSet[str], Tuple[Tuple[str, str], ...]]
+
+
+def _flatten(value) -> str:
+    if isinstance(value, (list, tuple, set)):
+        return " ".join(map(_flatten, value))
+    return str(value)
+
+
+def request_key(*args, **kwargs) -> Key:
+    """Normalizes the arguments of an Api call into a hashable cache key."""
+    params: Dict[str, Any] = {}
+    shards = []
+    for arg in args:
+        if isinstance(arg, dict):
+            params.update(arg)
+        else:
+            shards.append(arg)
+    params.update(kwargs)
+    shards.append(params.pop("q", ""))
+    query = frozenset(_flatten(shards).lower().split())
+    normalized = {}
+    for k, v in params.items():
+        v = _flatten(v)
+        if k in ("nation", "region", "nationname"):
+            v = "_".join(v.casefold().split())
+        elif k == "scale":
+            v = " ".join(sorted(v.split()))
+        normalized[k.lower()] = v.strip()
+    return query, tuple(sorted(normalized.items()))
+
+
+class ShardCache:
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        *,
+        ttls: Optional[Dict[str, int]] = None,
+        default_ttl: int = DEFAULT_TTL,
+    ):
+        self.maxsize = maxsize
+        self.ttls = SHARD_TTLS if ttls is None else ttls
+        self.default_ttl = default_ttl
+        self.hits = self.misses = self.evictions = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def ttl(self, shards: FrozenSet[str]) -> int:
+        return min((self.ttls.get(s, self.default_ttl) for s in shards), default=self.default_ttl)
+
+    def get(self, key: Hashable) -> Any:
+        try:
+            expires, value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        if expires <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[int] = None):
+        if ttl is None:
+            ttl = self.ttl(key[0])
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._data.clear()
+        self.hits = self.misses = self.evictions = 0
+
+
+class RenderCache:
+    """
+    Finished output, like embeds, keyed on whatever else went into rendering it.
+
+    An entry is only valid for the exact response object it was rendered from,
+    so it goes stale together with that response's ShardCache entry.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Tuple[Any, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, source: Any) -> Any:
+        entry = self._data.get(key)
+        if entry is None or entry[0] is not source:
+            return None
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: Hashable, source: Any, value: Any):
+        self._data[key] = (source, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
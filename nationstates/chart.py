@@ -0,0 +1,111 @@
+import struct
+import zlib
+from typing import List, Sequence, Tuple
+
+from .votes import Sample
+
+
+WIDTH, HEIGHT = 640, 320
+MARGIN = 12
+# palette indices
+BACKGROUND, GRID, FOR, AGAINST, NATIONS_FOR, NATIONS_AGAINST = range(6)
+PALETTE = (
+    (0x2F, 0x31, 0x36),
+    (0x4F, 0x54, 0x5C),
+    (0x43, 0xB5, 0x81),
+    (0xF0, 0x47, 0x47),
+    (0x2A, 0x6B, 0x4E),
+    (0x8E, 0x2F, 0x2F),
+)
+
+
+class Canvas:
+    """Just enough of a paletted raster to draw line charts without an imaging library."""
+
+    def __init__(self, width: int, height: int, background: int = 0):
+        self.width = width
+        self.height = height
+        self.pixels = bytearray([background]) * (width * height)
+
+    def plot(self, x: int, y: int, colour: int):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.pixels[y * self.width + x] = colour
+
+    def line(self, x0: int, y0: int, x1: int, y1: int, colour: int, thickness: int = 1):
+        # Bresenham, stamped with a small square for thickness
+        dx, dy = abs(x1 - x0), -abs(y1 - y0)
+        sx, sy = (1 if x0 < x1 else -1), (1 if y0 < y1 else -1)
+        err = dx + dy
+        while True:
+            for ox in range(thickness):
+                for oy in range(thickness):
+                    self.plot(x0 + ox, y0 + oy, colour)
+            if x0 == x1 and y0 == y1:
+                return
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x0 += sx
+            if e2 <= dx:
+                err += dx
+                y0 += sy
+
+    def polyline(self, points: Sequence[Tuple[int, int]], colour: int, thickness: int = 1):
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            self.line(x0, y0, x1, y1, colour, thickness)
+
+    def png(self, palette: Sequence[Tuple[int, int, int]]) -> bytes:
+        width = self.width
+        raw = b"".join(
+            b"\x00" + self.pixels[y * width : (y + 1) * width] for y in range(self.height)
+        )
+
+        def chunk(tag: bytes, data: bytes) -> bytes:
+            return (
+                struct.pack(">I", len(data))
+                + tag
+                + data
+                + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+            )
+
+        return b"".join(
+            (
+                b"\x89PNG\r\n\x1a\n",
+                chunk(b"IHDR", struct.pack(">IIBBBBB", width, self.height, 8, 3, 0, 0, 0)),
+                chunk(b"PLTE", b"".join(bytes(colour) for colour in palette)),
+                chunk(b"IDAT", zlib.compress(raw, 9)),
+                chunk(b"IEND", b""),
+            )
+        )
+
+
+def vote_chart(samples: List[Sample]) -> Tuple[bytes, int]:
+    """
+    Draws votes (bright) and nations (dim) for and against over time.
+
+    Returns the PNG and the value at the top of the chart.
+    """
+    canvas = Canvas(WIDTH, HEIGHT, BACKGROUND)
+    top = max(max(s.votes_for, s.votes_against, s.nations_for, s.nations_against) for s in samples)
+    top = max(1, top)
+    start, end = samples[0].timestamp, samples[-1].timestamp
+    span = max(1, end - start)
+    inner_w, inner_h = WIDTH - 2 * MARGIN, HEIGHT - 2 * MARGIN
+    for quarter in range(5):
+        y = MARGIN + inner_h * quarter // 4
+        canvas.line(MARGIN, y, WIDTH - MARGIN, y, GRID)
+
+    def points(field: str) -> List[Tuple[int, int]]:
+        return [
+            (
+                MARGIN + (s.timestamp - start) * inner_w // span,
+                HEIGHT - MARGIN - getattr(s, field) * inner_h // top,
+            )
+            for s in samples
+        ]
+
+    canvas.polyline(points("nations_for"), NATIONS_FOR)
+    canvas.polyline(points("nations_against"), NATIONS_AGAINST)
+    canvas.polyline(points("votes_for"), FOR, 2)
+    canvas.polyline(points("votes_against"), AGAINST, 2)
+    return canvas.png(PALETTE), top
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import sqlite3
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+
+log = logging.getLogger("red.fluffy.nationstates.dbid")
+
+
+class DBIDStore:
+    """
+    Maps nation names to their database IDs.
+
+    Nothing is read until it's asked for, and new mappings are written to disk
+    in batches rather than one at a time.
+    """
+
+    def __init__(self, path: Path, *, flush_delay: float = 30, cache_size: int = 4096):
+        self.path = path
+        self.flush_delay = flush_delay
+        self.cache_size = cache_size
+        self._conn: Optional[sqlite3.Connection] = None
+        self._recent: "OrderedDict[str, int]" = OrderedDict()
+        self._pending: Dict[str, int] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def open(self):
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dbids (nation TEXT PRIMARY KEY, dbid INTEGER NOT NULL) "
+            "WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def close(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if self._conn:
+            self.flush()
+            self._conn.close()
+            self._conn = None
+
+    def _remember(self, nation: str, dbid: int):
+        self._recent[nation] = dbid
+        self._recent.move_to_end(nation)
+        while len(self._recent) > self.cache_size:
+            self._recent.popitem(last=False)
+
+    def get(self, nation: str) -> Optional[int]:
+        dbid = self._pending.get(nation)
+        if dbid is None:
+            dbid = self._recent.get(nation)
+        if dbid is None:
+            row = self._conn.execute(
+                "SELECT dbid FROM dbids WHERE nation = ?", (nation,)
+            ).fetchone()
+            if row is None:
+                return None
+            dbid = row[0]
+        self._remember(nation, dbid)
+        return dbid
+
+    def __contains__(self, nation: str) -> bool:
+        return self.get(nation) is not None
+
+    def set(self, nation: str, dbid: int):
+        if self.get(nation) == dbid:
+            return
+        self._pending[nation] = dbid
+        self._remember(nation, dbid)
+        if not self._timer:
+            self._timer = asyncio.get_event_loop().call_later(self.flush_delay, self.flush)
+
+    def update(self, mapping: Iterable[Tuple[str, int]]):
+        self._conn.executemany("INSERT OR REPLACE INTO dbids VALUES (?, ?)", mapping)
+        self._conn.commit()
+
+    def flush(self):
+        self._timer = None
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            self.update(pending.items())
+        except sqlite3.Error:
+            log.exception("Failed to write %s DBIDs; will retry", len(pending))
+            pending.update(self._pending)
+            self._pending = pending
+            self._timer = asyncio.get_event_loop().call_later(self.flush_delay, self.flush)
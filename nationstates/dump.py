@@ -0,0 +1,212 @@
+import gzip
+import sqlite3
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from lxml import etree
+
+from .index import normalize
+
+
+NATION_COLUMNS = (
+    "id",
+    "name",
+    "fullname",
+    "region",
+    "region_name",
+    "unstatus",
+    "endorsements",
+    "population",
+    "category",
+    "flag",
+    "founded",
+    "motto",
+    "influence",
+    "lastlogin",
+    "dbid",
+)
+REGION_COLUMNS = (
+    "id",
+    "name",
+    "numnations",
+    "nations",
+    "delegate",
+    "delegatevotes",
+    "founder",
+    "power",
+    "flag",
+    "lastupdate",
+)
+BATCH_SIZE = 1000
+
+
+def _id(name: Optional[str]) -> Optional[str]:
+    # dumps write "0" for a missing delegate or founder
+    return normalize(name) if name and name != "0" else None
+
+
+def _number(text: Optional[str], kind=int):
+    try:
+        return kind(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def _nation_row(e) -> tuple:
+    region = e.findtext("REGION")
+    return (
+        _id(e.findtext("NAME")),
+        e.findtext("NAME"),
+        e.findtext("FULLNAME"),
+        _id(region),
+        region,
+        e.findtext("UNSTATUS"),
+        e.findtext("ENDORSEMENTS") or "",
+        _number(e.findtext("POPULATION"), float),
+        e.findtext("CATEGORY"),
+        e.findtext("FLAG"),
+        e.findtext("FOUNDED"),
+        e.findtext("MOTTO"),
+        e.findtext("INFLUENCE"),
+        _number(e.findtext("LASTLOGIN")),
+        _number(e.findtext("DBID")),
+    )
+
+
+def _region_row(e) -> tuple:
+    return (
+        _id(e.findtext("NAME")),
+        e.findtext("NAME"),
+        _number(e.findtext("NUMNATIONS")),
+        e.findtext("NATIONS") or "",
+        _id(e.findtext("DELEGATE")),
+        _number(e.findtext("DELEGATEVOTES")),
+        _id(e.findtext("FOUNDER")),
+        e.findtext("POWER"),
+        e.findtext("FLAG"),
+        _number(e.findtext("LASTUPDATE")),
+    )
+
+
+class DumpStore:
+    """
+    A local, indexed copy of the daily nations and regions dumps.
+
+    Ingestion streams the gzipped XML and never holds more than one
+    nation or region element, plus one batch of rows, in memory.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.path))
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS nations ({}, PRIMARY KEY (id)) WITHOUT ROWID".format(
+                ", ".join(NATION_COLUMNS)
+            )
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS nations_region ON nations (region)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS regions ({}, PRIMARY KEY (id)) WITHOUT ROWID".format(
+                ", ".join(REGION_COLUMNS)
+            )
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS ingested (kind TEXT PRIMARY KEY, source TEXT, at REAL, rows INTEGER)"
+        )
+        conn.commit()
+        return conn
+
+    def open(self):
+        self._conn = self._connect()
+        self._conn.row_factory = sqlite3.Row
+
+    def close(self):
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+    def ingest(self, source: Path) -> Tuple[str, int]:
+        """
+        Replaces the stored nations or regions with the contents of a dump.
+
+        Blocking; run it in an executor. It uses its own connection, so
+        lookups keep seeing the previous data until the ingest commits.
+        """
+        opener = gzip.open if source.suffix == ".gz" else open
+        conn = self._connect()
+        try:
+            with opener(source, "rb") as file:
+                events = etree.iterparse(file, events=("start", "end"))
+                _, root = next(events)
+                if root.tag == "NATIONS":
+                    kind, table, columns, make_row = (
+                        "nations",
+                        "nations",
+                        NATION_COLUMNS,
+                        _nation_row,
+                    )
+                elif root.tag == "REGIONS":
+                    kind, table, columns, make_row = (
+                        "regions",
+                        "regions",
+                        REGION_COLUMNS,
+                        _region_row,
+                    )
+                else:
+                    raise ValueError(f"{source} is not a nations or regions dump.")
+                insert = "INSERT OR REPLACE INTO {} VALUES ({})".format(
+                    table, ", ".join("?" * len(columns))
+                )
+                conn.execute(f"DELETE FROM {table}")
+                depth, batch, count = 0, [], 0
+                for event, element in events:
+                    if event == "start":
+                        depth += 1
+                        continue
+                    depth -= 1
+                    if depth:
+                        continue
+                    batch.append(make_row(element))
+                    # drop what's been parsed so the tree never grows
+                    element.clear()
+                    while element.getprevious() is not None:
+                        del root[0]
+                    if len(batch) >= BATCH_SIZE:
+                        conn.executemany(insert, batch)
+                        count += len(batch)
+                        batch.clear()
+                conn.executemany(insert, batch)
+                count += len(batch)
+            conn.execute(
+                "INSERT OR REPLACE INTO ingested VALUES (?, ?, ?, ?)",
+                (kind, str(source), time.time(), count),
+            )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return kind, count
+
+    def status(self) -> List[sqlite3.Row]:
+        return self._conn.execute("SELECT * FROM ingested ORDER BY kind").fetchall()
+
+    def nation(self, nation: str) -> Optional[sqlite3.Row]:
+        return self._conn.execute("SELECT * FROM nations WHERE id = ?", (nation,)).fetchone()
+
+    def region(self, region: str) -> Optional[sqlite3.Row]:
+        return self._conn.execute("SELECT * FROM regions WHERE id = ?", (region,)).fetchone()
+
+    def wa_residents(self, region: str) -> List[str]:
+        return [
+            row[0]
+            for row in self._conn.execute(
+                "SELECT id FROM nations WHERE region = ? AND unstatus != 'Non-member'", (region,)
+            )
+        ]
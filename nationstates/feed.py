@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, FrozenSet, Iterable, List, Optional, Set
+
+from .periodic import PeriodicTask
+
+
+log = logging.getLogger("red.fluffy.nationstates.feed")
+
+NATION_RE = re.compile(r"@@([-\w]+)@@")
+REGION_RE = re.compile(r"%%([-\w]+)%%")
+# checked in order; the first match decides the event's type
+EVENT_TYPES = (
+    ("founding", re.compile(r"(?i)\bwas (?:founded|refounded) in\b")),
+    ("cte", re.compile(r"(?i)\bceased to exist\b")),
+    ("move", re.compile(r"(?i)\brelocated from\b")),
+    (
+        "member",
+        re.compile(r"(?i)\b(?:admitted to|resigned from|ejected from) the World Assembly\b"),
+    ),
+    ("endo", re.compile(r"(?i)\bendorse")),
+    ("vote", re.compile(r"(?i)\bvoted (?:for|against)\b")),
+    ("resolution", re.compile(r"(?i)\bresolution\b")),
+    ("law", re.compile(r"(?i)\bfollowing new legislation\b")),
+    ("dispatch", re.compile(r"(?i)\bpublished\b")),
+    ("rmb", re.compile(r"(?i)\bregional message board\b")),
+    ("embassy", re.compile(r"(?i)\bembass")),
+    ("eject", re.compile(r"(?i)\b(?:ejected|banned)\b")),
+    ("admin", re.compile(r"(?i)\b(?:delegate|founder|officer|governor)\b")),
+    ("change", re.compile(r"(?i)\b(?:changed|altered|adopted)\b")),
+)
+TYPE_NAMES = frozenset(name for name, _ in EVENT_TYPES)
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    timestamp: int
+    text: str
+    kind: Optional[str]
+    nations: FrozenSet[str]
+    regions: FrozenSet[str]
+
+    @classmethod
+    def from_element(cls, element) -> "Event":
+        text = element.TEXT.text
+        kind = next((name for name, regex in EVENT_TYPES if regex.search(text)), None)
+        return cls(
+            id=int(element.get("id")),
+            timestamp=element.TIMESTAMP.pyval,
+            text=text,
+            kind=kind,
+            nations=frozenset(NATION_RE.findall(text)),
+            regions=frozenset(REGION_RE.findall(text)),
+        )
+
+    def markdown(self) -> str:
+        text = NATION_RE.sub(
+            lambda m: "[{}](https://www.nationstates.net/nation={})".format(
+                m.group(1).replace("_", " ").title(), m.group(1)
+            ),
+            self.text,
+        )
+        return REGION_RE.sub(
+            lambda m: "[{}](https://www.nationstates.net/region={})".format(
+                m.group(1).replace("_", " ").title(), m.group(1)
+            ),
+            text,
+        )
+
+    def plain(self) -> str:
+        text = NATION_RE.sub(lambda m: m.group(1).replace("_", " ").title(), self.text)
+        return REGION_RE.sub(lambda m: m.group(1).replace("_", " ").title(), text)
+
+
+@dataclass
+class Subscription:
+    regions: Set[str] = field(default_factory=set)
+    nations: Set[str] = field(default_factory=set)
+    types: Set[str] = field(default_factory=set)
+
+    def __bool__(self):
+        return bool(self.regions or self.nations or self.types)
+
+    def wants(self, event: Event) -> bool:
+        if self.types and event.kind not in self.types:
+            return False
+        if self.regions or self.nations:
+            return bool(self.regions & event.regions or self.nations & event.nations)
+        return True
+
+
+class HappeningsFeed(PeriodicTask):
+    """
+    Polls the world happenings once for every subscriber.
+
+    A single cursor tracks the newest event seen, and each new event is
+    routed to the channels whose subscription matches it.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[..., Awaitable],
+        deliver: Callable[[int, List[Event]], Awaitable],
+        *,
+        interval: float = 30,
+        limit: int = 200,
+        max_pages: int = 5,
+    ):
+        super().__init__(interval)
+        self._fetch = fetch
+        self._deliver = deliver
+        self.limit = limit
+        self.max_pages = max_pages
+        self.cursor: Optional[int] = None
+        self.subscriptions: Dict[int, Subscription] = {}
+
+    def subscribe(self, channel_id: int, subscription: Subscription):
+        if subscription:
+            self.subscriptions[channel_id] = subscription
+        else:
+            self.subscriptions.pop(channel_id, None)
+
+    def route(self, events: Iterable[Event]) -> Dict[int, List[Event]]:
+        routed = defaultdict(list)
+        for event in events:
+            for channel_id, subscription in self.subscriptions.items():
+                if subscription.wants(event):
+                    routed[channel_id].append(event)
+        return routed
+
+    async def _page(self, **params) -> List[Event]:
+        root = await self._fetch("happenings", **params)
+        return list(map(Event.from_element, root.iterfind("HAPPENINGS/EVENT")))
+
+    async def _since(self, cursor: int) -> List[Event]:
+        # the API hands back the newest events first, so a full page means paging backwards
+        events: Dict[int, Event] = {}
+        params = {"limit": str(self.limit), "sinceid": str(cursor)}
+        for _ in range(self.max_pages):
+            page = await self._page(**params)
+            events.update((event.id, event) for event in page)
+            if len(page) < self.limit:
+                break
+            params["beforeid"] = str(min(event.id for event in page))
+        else:
+            log.warning(
+                "More than %s happenings since event %s; the oldest of them were skipped",
+                self.limit * self.max_pages,
+                cursor,
+            )
+        return list(events.values())
+
+    async def poll(self):
+        if self.cursor is None:
+            # start from whatever is newest rather than replaying the backlog
+            events = await self._page(limit="1")
+        else:
+            events = await self._since(self.cursor)
+        events.sort(key=lambda e: e.id)
+        if not events:
+            return
+        first_poll = self.cursor is None
+        self.cursor = events[-1].id
+        if first_poll:
+            return
+        for channel_id, matched in self.route(events).items():
+            try:
+                await self._deliver(channel_id, matched)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Failed to deliver happenings to channel %s", channel_id)
+
+    async def tick(self):
+        if self.subscriptions:
+            await self.poll()
+        else:
+            # nobody was listening, so don't dump the backlog on the next subscriber
+            self.cursor = None
@@ -0,0 +1,92 @@
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, List, Optional, Set
+
+# pylint: disable=E0611
+from sans.errors import NotFound
+
+from .periodic import PeriodicTask
+from .scheduler import Priority
+from .stream import ListShardParser
+
+
+def normalize(name: str) -> str:
+    return "_".join(name.casefold().split())
+
+
+class MembershipIndex(PeriodicTask):
+    """
+    Resident copy of the WA member list and the residents of recently queried regions.
+
+    Everything is loaded on first use and then kept fresh by a background task,
+    so lookups in between refreshes never touch the API.
+    """
+
+    # nothing is loaded until it's first looked up
+    tick_on_start = False
+
+    def __init__(
+        self,
+        stream: Callable[..., AsyncIterator[List[str]]],
+        *,
+        interval: float = 900,
+        idle: float = 3600,
+        max_regions: int = 64,
+    ):
+        super().__init__(interval)
+        self._stream = stream
+        self.idle = idle
+        self.max_regions = max_regions
+        self.wa_members: Optional[Set[str]] = None
+        self.wa_updated = 0.0
+        # region -> [last access, nations]
+        self._regions: "OrderedDict[str, list]" = OrderedDict()
+
+    async def members(self) -> Set[str]:
+        if self.wa_members is None:
+            await self.refresh_members()
+        return self.wa_members
+
+    async def region(self, region: str) -> Set[str]:
+        region = normalize(region)
+        entry = self._regions.get(region)
+        if entry is None:
+            await self.refresh_region(region)
+            entry = self._regions[region]
+        entry[0] = time.monotonic()
+        self._regions.move_to_end(region)
+        return entry[1]
+
+    async def refresh_members(self, *, priority: Priority = Priority.INTERACTIVE):
+        members = set()
+        async for names in self._stream(
+            ListShardParser("MEMBERS", ","), q="members", wa="1", priority=priority
+        ):
+            members.update(names)
+        self.wa_members = members
+        self.wa_updated = time.monotonic()
+
+    async def refresh_region(self, region: str, *, priority: Priority = Priority.INTERACTIVE):
+        nations = set()
+        async for names in self._stream(
+            ListShardParser("NATIONS", ":"), q="nations", region=region, priority=priority
+        ):
+            nations.update(names)
+        entry = self._regions.setdefault(region, [time.monotonic(), nations])
+        entry[1] = nations
+        while len(self._regions) > self.max_regions:
+            self._regions.popitem(last=False)
+
+    async def tick(self):
+        # lookups made by commands keep their own priority; this only runs in the background
+        if self.wa_members is not None:
+            await self.refresh_members(priority=Priority.BACKGROUND)
+        cutoff = time.monotonic() - self.idle
+        for region, (accessed, _) in list(self._regions.items()):
+            if accessed < cutoff:
+                del self._regions[region]
+                continue
+            try:
+                await self.refresh_region(region, priority=Priority.BACKGROUND)
+            except NotFound:
+                self._regions.pop(region, None)
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from itertools import groupby
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from .periodic import PeriodicTask
+
+
+log = logging.getLogger("red.fluffy.nationstates.market")
+
+Card = Tuple[int, int]  # (card id, season)
+# (timestamp, best bid, best ask, market value)
+Snapshot = Tuple[float, Optional[float], Optional[float], float]
+
+
+class OrderBook:
+    def __init__(self, bids: List[Tuple[float, str]], asks: List[Tuple[float, str]], value: float):
+        # both sides are kept best price first
+        self.bids = sorted(bids, key=lambda o: (-o[0], o[1]))
+        self.asks = sorted(asks)
+        self.value = value
+        self.taken = time.time()
+
+    @classmethod
+    def from_root(cls, root) -> "OrderBook":
+        bids, asks = [], []
+        for market in root.MARKETS.iterchildren():
+            order = (market.PRICE.pyval, market.NATION.text)
+            if market.TYPE.text == "bid":
+                bids.append(order)
+            elif market.TYPE.text == "ask":
+                asks.append(order)
+        return cls(bids, asks, root.MARKET_VALUE.pyval)
+
+    @property
+    def best_bid(self) -> Optional[float]:
+        return self.bids[0][0] if self.bids else None
+
+    @property
+    def best_ask(self) -> Optional[float]:
+        return self.asks[0][0] if self.asks else None
+
+    @property
+    def spread(self) -> Optional[float]:
+        if self.bids and self.asks:
+            return self.asks[0][0] - self.bids[0][0]
+        return None
+
+    @staticmethod
+    def _levels(side: List[Tuple[float, str]], depth: int) -> List[Tuple[float, int]]:
+        levels = []
+        for price, orders in groupby(side, key=lambda o: o[0]):
+            levels.append((price, sum(1 for _ in orders)))
+            if len(levels) >= depth:
+                break
+        return levels
+
+    def bid_levels(self, depth: int = 5) -> List[Tuple[float, int]]:
+        return self._levels(self.bids, depth)
+
+    def ask_levels(self, depth: int = 5) -> List[Tuple[float, int]]:
+        return self._levels(self.asks, depth)
+
+
+class MarketWatcher(PeriodicTask):
+    def __init__(
+        self, fetch: Callable[..., Awaitable], *, interval: float = 300, history: int = 288
+    ):
+        super().__init__(interval)
+        self._fetch = fetch
+        self.watched: Set[Card] = set()
+        self.books: Dict[Card, OrderBook] = {}
+        self.history: Dict[Card, Deque[Snapshot]] = {}
+        self._history_size = history
+
+    def watch(self, card: Card):
+        self.watched.add(card)
+
+    def unwatch(self, card: Card):
+        self.watched.discard(card)
+        self.books.pop(card, None)
+        self.history.pop(card, None)
+
+    def observe(self, card: Card, root):
+        """Records a freshly fetched ``card info markets`` response for a watched card."""
+        if card not in self.watched:
+            return
+        book = self.books[card] = OrderBook.from_root(root)
+        history = self.history.setdefault(card, deque(maxlen=self._history_size))
+        history.append((book.taken, book.best_bid, book.best_ask, book.value))
+
+    async def refresh(self, card: Card):
+        root = await self._fetch("card info markets", cardid=card[0], season=card[1])
+        if root.countchildren():
+            self.observe(card, root)
+
+    async def tick(self):
+        for card in list(self.watched):
+            try:
+                await self.refresh(card)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Failed to snapshot the market for card %s", card)
@@ -0,0 +1,93 @@
+import bisect
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from .cache import Key
+
+
+log = logging.getLogger("red.fluffy.nationstates.metrics")
+
+# upper bounds of each bucket, in seconds; anything slower lands in the last one
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# request parameters that name what a request is about, in order of preference
+TARGETS = ("nation", "region", "wa", "cardid", "nationname")
+
+
+def shard_label(key: Key) -> str:
+    """A short, bounded name for the kind of request a cache key describes."""
+    query, params = key
+    target = next((k for k in TARGETS if k in dict(params)), "world")
+    return "{}:{}".format(target, "+".join(sorted(query)) or "-")
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+    def __len__(self):
+        return sum(self.counts)
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """The upper bound of the bucket holding the q-th quantile."""
+        rank = q * len(self)
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+
+class Metrics:
+    """
+    Latency histograms and event counters for the cog.
+
+    Histograms are keyed by (kind, name), e.g. ("request", "nation:fullname+wa")
+    or ("command", "nation"). Every observation is also handed to ``hook``,
+    if one is set, so it can be shipped somewhere else.
+    """
+
+    def __init__(self, hook: Optional[Callable[[str, str, float], None]] = None):
+        self.hook = hook
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}
+        self.counters: Counter = Counter()
+        self.since = time.time()
+
+    def observe(self, kind: str, name: str, seconds: float):
+        histogram = self.histograms.get((kind, name))
+        if histogram is None:
+            histogram = self.histograms[kind, name] = Histogram()
+        histogram.observe(seconds)
+        if self.hook:
+            try:
+                self.hook(kind, name, seconds)
+            except Exception:
+                log.exception("Metrics hook failed")
+
+    def incr(self, counter: str, amount: int = 1):
+        self.counters[counter] += amount
+
+    @contextmanager
+    def timer(self, kind: str, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(kind, name, time.perf_counter() - start)
+
+    def reset(self):
+        self.histograms.clear()
+        self.counters.clear()
+        self.since = time.time()
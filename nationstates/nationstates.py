@@ -1,15 +1,23 @@
+import aiohttp
 import asyncio
-import bisect
+import csv
 import discord
+import logging
 import re
+import sqlite3
 import time
+import weakref
 from datetime import datetime
 from enum import Flag, auto
+from contextlib import contextmanager
 from functools import reduce, partial
 from html import unescape
-from io import BytesIO
+from io import BytesIO, TextIOWrapper
 from operator import or_
-from typing import Generic, Type, TypeVar, Optional, Union
+from pathlib import Path
+from typing import Generic, List, Set, Tuple, Type, TypeVar, Optional, Union
+
+from lxml import etree
 
 # pylint: disable=E0611
 from sans.errors import HTTPException, NotFound
@@ -17,11 +25,30 @@ from sans.api import Api
 from sans.utils import pretty_string
 
 from redbot.core import checks, commands, Config, version_info as red_version
+from redbot.core.data_manager import cog_data_path
 from redbot.core.utils.chat_formatting import pagify, escape, box
+from redbot.core.utils.menus import menu, DEFAULT_CONTROLS
 
 # pylint: disable=E0401
 from cog_shared.proxyembed import ProxyEmbed
 
+from .atvote import AtVoteWatcher
+from .chart import vote_chart
+from .cache import RenderCache, ShardCache, request_key
+from .dbid import DBIDStore
+from .dump import DumpStore
+from .feed import TYPE_NAMES, HappeningsFeed, Subscription
+from .index import MembershipIndex, normalize
+from .market import MarketWatcher, OrderBook
+from .metrics import Metrics, shard_label
+from .resolutions import ResolutionIndex
+from .scheduler import Priority, Scheduler
+from .stream import API_URL, ListShardParser
+from .votes import VoteLog
+
+
+log = logging.getLogger("red.fluffy.nationstates")
+
 
 class Options(Flag):
     @classmethod
@@ -56,6 +83,7 @@ class WA(Options):
     VOTE = auto()
     NATION = auto()
     DELEGATE = auto()
+    CHART = auto()
 
 
 CARD_COLORS = {
@@ -70,6 +98,10 @@ LINK_RE = re.compile(
 )
 WA_RE = re.compile(r"(?i)\b(UN|GA|SC)R?#(\d+)\b")
 ZDAY_EPOCHS = (1572465600, 1572584400 + 604800)
+MAX_TARGETS = 20
+MAX_EXPORT = 500
+STREAM_CHUNK_SIZE = 1 << 16
+STREAM_ATTEMPTS = 3
 T = TypeVar("T", bound=Options)
 
 
@@ -88,6 +120,53 @@ class Link(str, Generic[T]):
         raise commands.BadArgument()
 
 
+class Links(list, Generic[T]):
+    @classmethod
+    def __class_getitem__(cls, item: Type[T]):
+        return partial(cls.links_extract, expected=item.__name__)
+
+    @staticmethod
+    def links_extract(links: str, *, expected: str):
+        # names and links never contain commas, so they are a safe separator
+        result = []
+        for link in filter(str.strip, links.split(",")):
+            link = Link.link_extract(link.strip(), expected=expected)
+            if link not in result:
+                result.append(link)
+        if not result:
+            raise commands.BadArgument()
+        if len(result) > MAX_TARGETS:
+            raise commands.BadArgument(f"You can only look up {MAX_TARGETS} at a time.")
+        return result
+
+
+def scale_ids(argument: str) -> List[int]:
+    try:
+        scales = sorted({int(s) for s in argument.replace(",", " ").split()})
+    except ValueError as ve:
+        raise commands.BadArgument("Census scales must be given as numeric IDs.") from ve
+    if not scales:
+        raise commands.BadArgument()
+    return scales
+
+
+def census_targets(argument: str) -> List[Tuple[str, str]]:
+    targets = []
+    for piece in filter(str.strip, argument.split(",")):
+        piece = piece.strip()
+        if piece.casefold().startswith("region:"):
+            kind, piece = "region", piece[7:]
+        else:
+            match = LINK_RE.match(piece)
+            kind = ((match and match.group(1)) or "nation").casefold()
+        target = (kind, Link.link_extract(piece, expected=kind.title()))
+        if target not in targets:
+            targets.append(target)
+    if not targets:
+        raise commands.BadArgument()
+    return targets
+
+
 class NationStates(commands.Cog):
 
     # __________ INIT __________
@@ -97,8 +176,29 @@ class NationStates(commands.Cog):
         Api.loop = bot.loop
         self.bot = bot
         self.config = Config.get_conf(self, identifier=2_113_674_295, force_registration=True)
-        self.config.register_global(agent=None)
-        self.db_cache = None
+        self.config.register_global(agent=None, watched_cards=[], prefer_dump=False)
+        self.dbids: Optional[DBIDStore] = None
+        self.resolutions: Optional[ResolutionIndex] = None
+        self.dump: Optional[DumpStore] = None
+        self.prefer_dump = False
+        self.votes: Optional[VoteLog] = None
+        self.cache = ShardCache()
+        self.rendered = RenderCache()
+        self._inflight = {}
+        self.scheduler = Scheduler()
+        self.metrics = Metrics(self._report_metric)
+        self._invoked = weakref.WeakKeyDictionary()
+        self.session: Optional[aiohttp.ClientSession] = None
+        # lookups run at their caller's priority; only its own refresh is background work
+        self.index = MembershipIndex(self._stream)
+        self.market = MarketWatcher(partial(self._fetch, priority=Priority.BACKGROUND))
+        self.at_vote = AtVoteWatcher(
+            partial(self._fetch, priority=Priority.BACKGROUND), observe=self._record_votes
+        )
+        self.feed = HappeningsFeed(
+            partial(self._fetch, priority=Priority.BACKGROUND), self._deliver_happenings
+        )
+        self.config.register_channel(feed={"regions": [], "nations": [], "types": []})
         self.config.init_custom("NATION", 1)
         self.config.register_custom("NATION", dbid=None)
 
@@ -112,21 +212,77 @@ class NationStates(commands.Cog):
             # only make the user_info request if necessary
             agent = str(self.bot.get_user(owner_id) or await self.bot.fetch_user(owner_id))
         Api.agent = f"{agent} Red-DiscordBot/{red_version}"
-        self.db_cache = await self.config.custom("NATION").all()
+        self.session = aiohttp.ClientSession()
+        self.dbids = DBIDStore(cog_data_path(self) / "dbids.sqlite3")
+        self.dbids.open()
+        self.resolutions = ResolutionIndex(cog_data_path(self) / "resolutions.sqlite3")
+        self.resolutions.open()
+        self.dump = DumpStore(cog_data_path(self) / "dump.sqlite3")
+        self.dump.open()
+        self.prefer_dump = await self.config.prefer_dump()
+        self.votes = VoteLog(cog_data_path(self) / "votes")
+        # one-time migration from Config; it's left empty afterwards
+        legacy = await self.config.custom("NATION").all()
+        if legacy:
+            self.dbids.update((k, v["dbid"]) for k, v in legacy.items() if v.get("dbid"))
+            await self.config.custom("NATION").clear()
+        self.index.start(self.bot.loop)
+        for card in await self.config.watched_cards():
+            self.market.watch(tuple(card))
+        self.market.start(self.bot.loop)
+        self.at_vote.start(self.bot.loop)
+        for channel_id, data in (await self.config.all_channels()).items():
+            feed = data["feed"]
+            self.feed.subscribe(channel_id, Subscription(**{k: set(v) for k, v in feed.items()}))
+        self.feed.start(self.bot.loop)
+
+    def cog_unload(self):
+        self.index.stop()
+        self.market.stop()
+        self.at_vote.stop()
+        self.feed.stop()
+        self.scheduler.close()
+        if self.dbids:
+            self.dbids.close()
+        if self.resolutions:
+            self.resolutions.close()
+        if self.dump:
+            self.dump.close()
+        if self.session:
+            self.bot.loop.create_task(self.session.close())
 
     def cog_check(self, ctx):
         if not ctx.channel.permissions_for(ctx.me).send_messages:
             raise commands.BotMissingPermissions(["send_messages"])
-        # this will also cause `[p]agent` to be blocked but this is intended
-        if ctx.cog is not self:
-            return True
-        xra = Api.xra
-        if xra:
-            raise commands.CommandOnCooldown(None, time.time() - xra)
         return True
 
+    async def cog_before_invoke(self, ctx):
+        self._invoked[ctx] = time.perf_counter()
+        # requests are queued rather than rejected near the rate limit; say so if it'll take a while
+        # commands that take several targets send a request for each
+        targets = ctx.kwargs.get("nations") or ctx.kwargs.get("regions")
+        wait = self.scheduler.estimate(Priority.INTERACTIVE, len(targets) if targets else 1)
+        if wait >= 2:
+            await ctx.send(
+                f"NationStates is busy: {self.scheduler.depth} requests are queued "
+                f"ahead of yours. Expect a wait of about {wait:.0f} seconds.",
+                delete_after=wait,
+            )
+
+    async def cog_after_invoke(self, ctx):
+        self._observe_command(ctx)
+
+    def _observe_command(self, ctx):
+        started = self._invoked.pop(ctx, None)
+        if started is not None:
+            self.metrics.observe(
+                "command", ctx.command.qualified_name, time.perf_counter() - started
+            )
+
     def cog_command_error(self, ctx, error):
         # not a coro but returns one anyway
+        self.metrics.incr("command_error")
+        self._observe_command(ctx)
         original = getattr(error, "original", None)
         if original:
             if isinstance(original, asyncio.TimeoutError):
@@ -137,6 +293,151 @@ class NationStates(commands.Cog):
 
     # __________ UTILS __________
 
+    async def _fetch(self, *shards, priority: Priority = Priority.INTERACTIVE, **kwargs):
+        # identical requests already on the wire share one response
+        key = request_key(*shards, **kwargs)
+        entry = self._inflight.get(key)
+        if entry is None:
+            slot = self.scheduler.enqueue(priority)
+            future = asyncio.ensure_future(self._send(priority, *shards, slot=slot, **kwargs))
+            self._inflight[key] = future, slot
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            future, slot = entry
+            # an interactive caller joining queued background work shouldn't wait behind it
+            self.scheduler.promote(slot, priority)
+        # shielded so one impatient caller doesn't cancel it for everyone
+        return await asyncio.shield(future)
+
+    async def _send(
+        self, priority: Priority, *shards, slot: Optional[asyncio.Future] = None, **kwargs
+    ):
+        if slot is None:
+            slot = self.scheduler.enqueue(priority)
+        with self.metrics.timer("queue", priority.name.lower()):
+            await slot
+        with self._track(shard_label(request_key(*shards, **kwargs))):
+            return await Api(*shards, **kwargs)
+
+    @contextmanager
+    def _track(self, label: str):
+        # times one request and counts how it failed, if it did
+        try:
+            with self.metrics.timer("request", label):
+                yield
+        except NotFound:
+            self.metrics.incr("not_found")
+            raise
+        except asyncio.TimeoutError:
+            self.metrics.incr("timeout")
+            raise
+        except HTTPException as e:
+            self.metrics.incr("http_429" if e.status == 429 else "http_error")
+            raise
+
+    def _report_metric(self, kind: str, name: str, seconds: float):
+        log.debug(
+            "%s %s took %.3fs",
+            kind,
+            name,
+            seconds,
+            extra={"metric_kind": kind, "metric_name": name, "metric_seconds": seconds},
+        )
+        self.bot.dispatch("nationstates_metric", kind, name, seconds)
+
+    async def _stream(
+        self, parser: ListShardParser, *, priority: Priority = Priority.INTERACTIVE, **params
+    ):
+        # sans only hands back complete trees, so big list shards are read off the wire directly
+        label = shard_label(request_key(**params))
+        for attempt in range(STREAM_ATTEMPTS):
+            with self.metrics.timer("queue", priority.name.lower()):
+                await self.scheduler.acquire(priority)
+            try:
+                # only up to the headers; reading the body is timed as parsing below
+                with self._track(label):
+                    response = await self.session.get(
+                        API_URL, params=params, headers={"User-Agent": Api.agent}
+                    )
+                    try:
+                        response.raise_for_status()
+                    except aiohttp.ClientResponseError as e:
+                        response.release()
+                        # sans picks the subclass (NotFound, ...) from the status
+                        raise HTTPException(e) from e
+            except HTTPException as e:
+                if e.status != 429 or attempt == STREAM_ATTEMPTS - 1:
+                    raise
+                # sans never saw this response, so the lockout is passed on by hand
+                self.scheduler.lock_out(float(e.headers.get("X-Retry-After", 30)))
+                continue
+            break
+        parsing = 0.0
+        try:
+            async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                start = time.perf_counter()
+                names = parser.feed(chunk)
+                parsing += time.perf_counter() - start
+                if names:
+                    yield names
+        finally:
+            response.release()
+        names = parser.close()
+        self.metrics.observe("parse", label, parsing)
+        if names:
+            yield names
+
+    async def _request(self, *shards, priority: Priority = Priority.INTERACTIVE, **kwargs):
+        key = request_key(*shards, **kwargs)
+        root = self.cache.get(key)
+        if root is None:
+            self.metrics.incr("cache_miss")
+            root = await self._fetch(*shards, priority=priority, **kwargs)
+            self.cache.set(key, root)
+        else:
+            self.metrics.incr("cache_hit")
+        return root
+
+    def _dump_lookup(self, kind: str, *args):
+        # the dump is only ever a shortcut; if it's broken, the API still answers
+        if not self.dump:
+            return None
+        try:
+            return getattr(self.dump, kind)(*args)
+        except sqlite3.Error:
+            log.exception("Could not read %s %s from the dump", kind, args)
+            return None
+
+    async def _dump_or_request(self, kind: str, target: str, *shards, **kwargs):
+        """
+        Returns ``(row, None)`` from the dump or ``(None, root)`` from the API.
+
+        The dump answers first if it's preferred, and otherwise only
+        when the API errors or times out. Not Found is never second-guessed.
+        """
+        if self.prefer_dump:
+            row = self._dump_lookup(kind, target)
+            if row is not None:
+                self.metrics.incr("dump_hit")
+                return row, None
+        try:
+            return None, await self._request(*shards, **{kind: target}, **kwargs)
+        except NotFound:
+            raise
+        except (HTTPException, asyncio.TimeoutError):
+            row = self._dump_lookup(kind, target)
+            if row is None:
+                raise
+            self.metrics.incr("dump_fallback")
+            return row, None
+
+    @staticmethod
+    async def _send_pages(ctx, embeds: List[ProxyEmbed]):
+        if len(embeds) > 1 and await ctx.embed_requested():
+            return await menu(ctx, embeds, DEFAULT_CONTROLS)
+        for embed in embeds:
+            await embed.send_to(ctx)
+
     @staticmethod
     def _illion(num):
         illion = ("million", "billion", "trillion", "quadrillion")
@@ -162,16 +463,21 @@ class NationStates(commands.Cog):
         if ctx.valid:
             return
         index = ["un", "ga", "sc"]
+        seen = set()
         for match in WA_RE.finditer(message.content):
             council = index.index(match.group(1).lower())
             res_id = match.group(2)
+            if (council, res_id) in seen:
+                continue
+            seen.add((council, res_id))
             if council == 0:
                 await ctx.send(
                     f"https://www.nationstates.net/page=WA_past_resolution/id={res_id}/un=1"
                 )
                 continue
             ctx.invoked_with = match.group(1).lower()
-            await ctx.invoke(self.wa, int(res_id))
+            # auto-links shouldn't hold up people running commands
+            await self._send_resolution(ctx, int(res_id), WA.NONE, priority=Priority.BACKGROUND)
 
     # __________ STANDARD __________
 
@@ -189,20 +495,90 @@ class NationStates(commands.Cog):
         await self.config.agent.set(agent)
         await ctx.send(f"Agent set: {Api.agent}")
 
-    @commands.command()
-    async def nation(self, ctx, *, nation: Link[Nation]):
-        """Retrieves general info about a specified NationStates nation"""
-        api: Api = Api(
-            "census category dbid",
-            "demonym2plural flag founded freedom",
-            "fullname influence lastlogin motto",
-            "name population region wa zombie",
-            nation=nation,
-            mode="score",
-            scale="65 66",
+    @commands.group(invoke_without_command=True)
+    @checks.is_owner()
+    async def nscache(self, ctx):
+        """Shows statistics about the NationStates response cache."""
+        cache = self.cache
+        total = cache.hits + cache.misses
+        await ctx.send(
+            box(
+                f"Entries:   {len(cache)}/{cache.maxsize}\n"
+                f"Hits:      {cache.hits}\n"
+                f"Misses:    {cache.misses}\n"
+                f"Evictions: {cache.evictions}\n"
+                f"Hit rate:  {cache.hits / total if total else 0:.1%}"
+            )
         )
+
+    @commands.group(invoke_without_command=True)
+    @checks.is_owner()
+    async def nsmetrics(self, ctx):
+        """
+        Shows request, parse, render and command timings
+
+        Times are the upper bounds of the histogram buckets the 50th and 95th percentiles fall in.
+        Every observation is also dispatched as a `nationstates_metric` event.
+        """
+        metrics = self.metrics
+        lines = [
+            "Since {:%Y-%m-%d %H:%M} UTC, xra lockouts seen: {}".format(
+                datetime.utcfromtimestamp(metrics.since), metrics.counters["http_429"]
+            ),
+            " | ".join(f"{k}: {v}" for k, v in sorted(metrics.counters.items())) or "No counts",
+            "",
+            "{:<9} {:>6} {:>8} {:>8} {:>8}  {}".format(
+                "kind", "count", "p50", "p95", "max", "name"
+            ),
+        ]
+        for (kind, name), hist in sorted(
+            metrics.histograms.items(), key=lambda item: item[1].total, reverse=True
+        ):
+            lines.append(
+                "{:<9} {:>6} {:>7.3f}s {:>7.3f}s {:>7.3f}s  {}".format(
+                    kind, len(hist), hist.quantile(0.5), hist.quantile(0.95), hist.max, name
+                )
+            )
+        await ctx.send_interactive(pagify("\n".join(lines), shorten_by=10), "py")
+
+    @nsmetrics.command(name="reset")
+    async def nsmetrics_reset(self, ctx):
+        """Clears all NationStates timings and counters."""
+        self.metrics.reset()
+        await ctx.tick()
+
+    @nscache.command(name="clear")
+    async def nscache_clear(self, ctx):
+        """Empties the NationStates response cache."""
+        self.cache.clear()
+        self.rendered.clear()
+        await ctx.tick()
+
+    @commands.command(usage="<nation> [nations...]")
+    async def nation(self, ctx, *, nations: Links[Nation]):
+        """
+        Retrieves general info about the specified NationStates nations
+
+        Separate multiple nations with commas.
+        """
+        await self._send_pages(
+            ctx, await asyncio.gather(*(self._nation_embed(ctx, nation) for nation in nations))
+        )
+
+    async def _nation_embed(self, ctx, nation: str) -> ProxyEmbed:
+        zday = self._is_zday(ctx.message)
+        colour = await ctx.embed_colour()
         try:
-            root = await api
+            row, root = await self._dump_or_request(
+                "nation",
+                nation,
+                "census category dbid",
+                "demonym2plural flag founded freedom",
+                "fullname influence lastlogin motto",
+                "name population region wa zombie",
+                mode="score",
+                scale="65 66",
+            )
         except NotFound:
             embed = ProxyEmbed(
                 title=nation.replace("_", " ").title(),
@@ -211,11 +587,17 @@ class NationStates(commands.Cog):
             )
             embed.set_author(name="NationStates", url="https://www.nationstates.net/")
             embed.set_thumbnail(url="http://i.imgur.com/Pp1zO19.png")
-            return await embed.send_to(ctx)
+            return embed
+        if row is not None:
+            return await self._dump_nation_embed(ctx, row)
+        key = ("nation", nation, zday, colour)
+        embed = self.rendered.get(key, root)
+        if embed is not None:
+            self.metrics.incr("render_hit")
+            return embed
+        started = time.perf_counter()
         n_id = root.get("id")
-        if n_id not in self.db_cache:
-            self.db_cache[n_id] = {"dbid": root.DBID.pyval}
-            await self.config.custom("NATION", n_id).dbid.set(root.DBID.pyval)
+        self.dbids.set(n_id, root.DBID.pyval)
         endo = root.find("CENSUS/SCALE[@id='66']/SCORE").pyval
         if endo == 1:
             endo = "{:.0f} endorsement".format(endo)
@@ -234,7 +616,7 @@ class NationStates(commands.Cog):
                 founded,
             ),
             timestamp=datetime.utcfromtimestamp(root.LASTLOGIN.pyval),
-            colour=0x8BBC21 if self._is_zday(ctx.message) else await ctx.embed_colour(),
+            colour=0x8BBC21 if zday else colour,
         )
         embed.set_author(name="NationStates", url="https://www.nationstates.net/")
         embed.set_thumbnail(url=root.FLAG.text)
@@ -254,7 +636,7 @@ class NationStates(commands.Cog):
             ),
             inline=False,
         )
-        if self._is_zday(ctx.message):
+        if zday:
             embed.add_field(
                 name="{}{}".format(
                     (root.find("ZOMBIE/ZACTION") or "No Action").title(),
@@ -277,23 +659,44 @@ class NationStates(commands.Cog):
             ),
         )
         embed.set_footer(text="Last Active")
-        await embed.send_to(ctx)
+        self.metrics.observe("render", "nation", time.perf_counter() - started)
+        self.rendered.set(key, root, embed)
+        return embed
 
-    @commands.command()
-    async def region(self, ctx, *, region: Link[Region]):
-        """Retrieves general info about a specified NationStates region"""
-        api: Api = Api(
-            "delegate delegateauth delegatevotes flag founded founder founderauth lastupdate name numnations power tags zombie",
-            region=region,
+    @commands.command(usage="<region> [regions...]")
+    async def region(self, ctx, *, regions: Links[Region]):
+        """
+        Retrieves general info about the specified NationStates regions
+
+        Separate multiple regions with commas.
+        """
+        await self._send_pages(
+            ctx, await asyncio.gather(*(self._region_embed(ctx, region) for region in regions))
         )
+
+    async def _region_embed(self, ctx, region: str) -> ProxyEmbed:
+        zday = self._is_zday(ctx.message)
+        colour = await ctx.embed_colour()
         try:
-            root = await api
+            row, root = await self._dump_or_request(
+                "region",
+                region,
+                "delegate delegateauth delegatevotes flag founded founder founderauth lastupdate name numnations power tags zombie",
+            )
         except NotFound:
             embed = ProxyEmbed(
                 title=region.replace("_", " ").title(), description="This region does not exist."
             )
             embed.set_author(name="NationStates", url="https://www.nationstates.net/")
-            return await embed.send_to(ctx)
+            return embed
+        if row is not None:
+            return await self._dump_region_embed(ctx, row)
+        key = ("region", region, zday, colour)
+        embed = self.rendered.get(key, root)
+        if embed is not None:
+            self.metrics.incr("render_hit")
+            return embed
+        started = time.perf_counter()
         if root.DELEGATE.pyval == 0:
             delvalue = "No Delegate"
         else:
@@ -348,18 +751,14 @@ class NationStates(commands.Cog):
             url="https://www.nationstates.net/region={}".format(root.get("id")),
             description=description,
             timestamp=datetime.utcfromtimestamp(root.LASTUPDATE.pyval),
-            colour=0x000001
-            if fash
-            else 0x8BBC21
-            if self._is_zday(ctx.message)
-            else await ctx.embed_colour(),
+            colour=0x000001 if fash else 0x8BBC21 if zday else colour,
         )
         embed.set_author(name="NationStates", url="https://www.nationstates.net/")
         if root.FLAG.pyval:
             embed.set_thumbnail(url=root.FLAG.pyval)
         embed.add_field(name=founderheader, value=foundervalue, inline=False)
         embed.add_field(name=delheader, value=delvalue, inline=False)
-        if self._is_zday(ctx.message):
+        if zday:
             embed.add_field(
                 name="Zombies",
                 value="Survivors: {} | Zombies: {} | Dead: {}".format(
@@ -370,7 +769,9 @@ class NationStates(commands.Cog):
                 inline=False,
             )
         embed.set_footer(text="Last Updated")
-        await embed.send_to(ctx)
+        self.metrics.observe("render", "region", time.perf_counter() - started)
+        self.rendered.set(key, root, embed)
+        return embed
 
     # __________ CARDS __________
 
@@ -390,31 +791,40 @@ class NationStates(commands.Cog):
         """
         if season is not None and nation is None:
             season, nation = 2, season
-        if isinstance(nation, str) and nation not in self.db_cache:
-            api = Api("dbid", nation=nation)
-            try:
-                root = await api
-            except NotFound:
-                return await ctx.send(
-                    f"Nation {nation!r} does not exist. "
-                    "Please provide its card ID instead, and I'll remember it for next time."
-                )
-            n_id, nation = root.get("id"), root.DBID.pyval
-            self.db_cache[n_id] = {"dbid": nation}
-            await self.config.custom("NATION", n_id).dbid.set(nation)
-        else:
-            n_id, nation = None, self.db_cache.get(nation, {}).get("dbid", nation)
+        n_id = None
+        if isinstance(nation, str):
+            dbid = self.dbids.get(nation)
+            if dbid is None:
+                try:
+                    root = await self._request("dbid", nation=nation)
+                except NotFound:
+                    return await ctx.send(
+                        f"Nation {nation!r} does not exist. "
+                        "Please provide its card ID instead, and I'll remember it for next time."
+                    )
+                n_id, dbid = root.get("id"), root.DBID.pyval
+                self.dbids.set(n_id, dbid)
+            nation = dbid
         assert isinstance(nation, int), repr(nation)
-        api = Api("card info markets", cardid=nation, season=season)
-        root = await api
+        root = await self._request("card info markets", cardid=nation, season=season)
         if not root.countchildren():
             if n_id:
                 return await ctx.send(f"No such S{season} card for nation {n_id!r}.")
             return await ctx.send(f"No such S{season} card for ID {nation!r}.")
         n_id = root.NAME.text.casefold().replace(" ", "_")
-        if n_id not in self.db_cache:
-            self.db_cache[n_id] = {"dbid": nation}
-            await self.config.custom("NATION", n_id).dbid.set(nation)
+        self.dbids.set(n_id, nation)
+        key = ("card", nation, season)
+        embed = self.rendered.get(key, root)
+        if embed is None:
+            with self.metrics.timer("render", "card"):
+                embed = self._card_embed(root, nation, season)
+            self.rendered.set(key, root, embed)
+        else:
+            self.metrics.incr("render_hit")
+        await embed.send_to(ctx)
+
+    @staticmethod
+    def _card_embed(root, nation: int, season: int) -> ProxyEmbed:
         embed = ProxyEmbed(
             title=f"The {root.TYPE.pyval} of {root.NAME.pyval}",
             url=f"https://www.nationstates.net/page=deck/card={nation}/season={season}",
@@ -429,19 +839,12 @@ class NationStates(commands.Cog):
             value=box(root.MARKET_VALUE.text, lang="swift"),
             inline=False,
         )
-        sellers, buyers = [], []
-        for market in root.MARKETS.iterchildren():
-            # negative price to reverse sorting
-            if market.TYPE.text == "bid":
-                bisect.insort(
-                    buyers, (-market.PRICE.pyval, market.NATION.text.replace("_", " ").title())
-                )
-            elif market.TYPE.text == "ask":
-                bisect.insort(
-                    sellers, (market.PRICE.pyval, market.NATION.text.replace("_", " ").title())
-                )
+        book = OrderBook.from_root(root)
+        # the formatting below expects bid prices negated
+        buyers = [(-price, name.replace("_", " ").title()) for price, name in book.bids]
+        sellers = [(price, name.replace("_", " ").title()) for price, name in book.asks]
         if not any((buyers, sellers)):
-            return await embed.send_to(ctx)
+            return embed
         max_listed = 5
         max_len = max(len(buyers), len(sellers))
         max_len = min(max_len, max_listed + 1)
@@ -478,25 +881,22 @@ class NationStates(commands.Cog):
                 name=embed.fields[is_buyers + 1].name,
                 value=box(raw_text, lang="swift"),
             )
-        await embed.send_to(ctx)
+        return embed
 
     @commands.command()
     async def deck(self, ctx, *, nation: Union[int, Link[Nation]]):
         """Retrieves general info about the specified nation's deck."""
         is_id = isinstance(nation, int)
         if is_id:
-            api = Api("cards info", nationid=nation)
+            root = await self._request("cards info", nationid=nation)
         else:
-            api = Api("cards info", nationname=nation)
-        root = await api
+            root = await self._request("cards info", nationname=nation)
         if not root.INFO.countchildren():
             if is_id:
                 return await ctx.send(f"No such deck for ID {nation}.")
             return await ctx.send(f"No such deck for nation {nation!r}.")
         n_id = root.INFO.NAME.text
-        if n_id not in self.db_cache:
-            self.db_cache[n_id] = {"dbid": root.INFO.ID.pyval}
-            await self.config.custom("NATION", n_id).dbid.set(root.INFO.ID.pyval)
+        self.dbids.set(n_id, root.INFO.ID.pyval)
         embed = ProxyEmbed(
             title=n_id.replace("_", " ").title(),
             url=f"https://www.nationstates.net/page=deck/nation={n_id}",
@@ -514,8 +914,261 @@ class NationStates(commands.Cog):
         embed.set_footer(text="Last Valued")
         await embed.send_to(ctx)
 
+    @commands.group()
+    async def market(self, ctx):
+        """Snapshots of the card market for watched cards."""
+        pass
+
+    @market.command(name="watch")
+    @checks.is_owner()
+    async def market_watch(self, ctx, card_id: int, season: int = 2):
+        """Starts taking periodic snapshots of a card's market."""
+        card = (card_id, season)
+        async with self.config.watched_cards() as watched:
+            if list(card) not in watched:
+                watched.append(list(card))
+        self.market.watch(card)
+        # the watcher's own snapshots are background work, but someone's waiting on this one
+        root = await self._fetch("card info markets", cardid=card_id, season=season)
+        if root.countchildren():
+            self.market.observe(card, root)
+        await ctx.tick()
+
+    @market.command(name="unwatch")
+    @checks.is_owner()
+    async def market_unwatch(self, ctx, card_id: int, season: int = 2):
+        """Stops taking snapshots of a card's market."""
+        card = (card_id, season)
+        async with self.config.watched_cards() as watched:
+            if list(card) in watched:
+                watched.remove(list(card))
+        self.market.unwatch(card)
+        await ctx.tick()
+
+    @market.command(name="quote")
+    async def market_quote(self, ctx, card_id: int, season: int = 2):
+        """Shows the best bid, best ask and spread from the latest snapshot."""
+        book = self.market.books.get((card_id, season))
+        if not book:
+            return await ctx.send(f"No snapshot of S{season} card {card_id} is available.")
+        embed = ProxyEmbed(
+            title=f"S{season} Card {card_id}",
+            url=f"https://www.nationstates.net/page=deck/card={card_id}/season={season}",
+            timestamp=datetime.utcfromtimestamp(book.taken),
+            colour=await ctx.embed_colour(),
+        )
+        embed.add_field(name="Market Value (estimated)", value=f"{book.value:.02f}", inline=False)
+        for name, price, levels in (
+            ("Best Bid", book.best_bid, book.bid_levels()),
+            ("Best Ask", book.best_ask, book.ask_levels()),
+        ):
+            if price is None:
+                embed.add_field(name=name, value="None")
+                continue
+            embed.add_field(
+                name=name,
+                value=box(
+                    "\n".join(f"{p:.02f} \N{MULTIPLICATION SIGN}{n}" for p, n in levels),
+                    lang="swift",
+                ),
+            )
+        if book.spread is not None:
+            embed.add_field(name="Spread", value=f"{book.spread:.02f}")
+        embed.set_footer(text="Snapshot taken")
+        await embed.send_to(ctx)
+
+    @market.command(name="history")
+    async def market_history(self, ctx, card_id: int, season: int = 2):
+        """Shows recent snapshots of a watched card's market."""
+        history = self.market.history.get((card_id, season))
+        if not history:
+            return await ctx.send(f"No snapshot of S{season} card {card_id} is available.")
+        rows = ["Time (UTC)         Bid     Ask   Value"]
+        for taken, bid, ask, value in reversed(history):
+            rows.append(
+                "{:%Y-%m-%d %H:%M} {:>7} {:>7} {:>7.02f}".format(
+                    datetime.utcfromtimestamp(taken),
+                    "-" if bid is None else f"{bid:.02f}",
+                    "-" if ask is None else f"{ask:.02f}",
+                    value,
+                )
+            )
+        await ctx.send_interactive(pagify("\n".join(rows), shorten_by=11), "swift")
+
+    # __________ HAPPENINGS __________
+
+    async def _deliver_happenings(self, channel_id: int, events):
+        channel = self.bot.get_channel(channel_id)
+        if not channel:
+            return
+        perms = channel.permissions_for(channel.guild.me)
+        if not perms.send_messages:
+            return
+        if perms.embed_links:
+            colour = await self.bot.get_embed_colour(channel)
+            for page in pagify("\n".join(e.markdown() for e in events), page_length=2048):
+                await channel.send(embed=discord.Embed(description=page, colour=colour))
+        else:
+            for page in pagify("\n".join(e.plain() for e in events)):
+                await channel.send(page)
+
+    async def _toggle_feed(self, ctx, key: str, value: str):
+        async with self.config.channel(ctx.channel).feed() as feed:
+            if value in feed[key]:
+                feed[key].remove(value)
+                added = False
+            else:
+                feed[key].append(value)
+                added = True
+            self.feed.subscribe(
+                ctx.channel.id, Subscription(**{k: set(v) for k, v in feed.items()})
+            )
+        await ctx.send(
+            "This channel will {} receive {} happenings.".format(
+                "now" if added else "no longer", value.replace("_", " ").title()
+            )
+        )
+
+    @commands.group()
+    @commands.guild_only()
+    @checks.admin_or_permissions(manage_channels=True)
+    async def nsfeed(self, ctx):
+        """
+        Relays NationStates happenings to this channel.
+
+        Subscribe to any mix of regions, nations and event types.
+        If only event types are set, matching events from the whole world are relayed.
+        """
+        pass
+
+    @nsfeed.command(name="region")
+    async def nsfeed_region(self, ctx, *, region: Link[Region]):
+        """Toggles happenings that involve the specified region."""
+        await self._toggle_feed(ctx, "regions", region)
+
+    @nsfeed.command(name="nation")
+    async def nsfeed_nation(self, ctx, *, nation: Link[Nation]):
+        """Toggles happenings that involve the specified nation."""
+        await self._toggle_feed(ctx, "nations", nation)
+
+    @nsfeed.command(name="type")
+    async def nsfeed_type(self, ctx, event_type: str.lower):
+        """
+        Toggles a type of happening.
+
+        Valid types: admin, change, cte, dispatch, embassy, eject, endo,
+        founding, law, member, move, resolution, rmb, vote
+        """
+        if event_type not in TYPE_NAMES:
+            raise commands.BadArgument()
+        await self._toggle_feed(ctx, "types", event_type)
+
+    @nsfeed.command(name="list")
+    async def nsfeed_list(self, ctx):
+        """Lists this channel's subscriptions."""
+        feed = await self.config.channel(ctx.channel).feed()
+        if not any(feed.values()):
+            return await ctx.send("This channel has no subscriptions.")
+        await ctx.send(
+            box(
+                "\n".join(
+                    "{}: {}".format(key.title(), ", ".join(values) or "Any")
+                    for key, values in feed.items()
+                )
+            )
+        )
+
+    @nsfeed.command(name="clear")
+    async def nsfeed_clear(self, ctx):
+        """Removes all of this channel's subscriptions."""
+        await self.config.channel(ctx.channel).feed.clear()
+        self.feed.subscribe(ctx.channel.id, Subscription())
+        await ctx.tick()
+
     # __________ ASSEMBLY __________
 
+    @staticmethod
+    def _pyval(root, path: str):
+        element = root.find(path)
+        return None if element is None else element.pyval
+
+    @classmethod
+    def _resolution_data(cls, root) -> dict:
+        delvotes = {}
+        for side in ("FOR", "AGAINST"):
+            delvotes[side.lower()] = [
+                (e.NATION.text, e.VOTES.pyval)
+                for e in sorted(
+                    root.iterfind(f"DELVOTES_{side}/DELEGATE"),
+                    key=lambda e: e.VOTES.pyval,
+                    reverse=True,
+                )[:10]
+            ]
+        return {
+            "name": root.NAME.text,
+            "category": root.CATEGORY.text,
+            "desc": root.DESC.text,
+            "proposed_by": root.PROPOSED_BY.text,
+            "promoted": cls._pyval(root, "PROMOTED"),
+            "implemented": cls._pyval(root, "IMPLEMENTED"),
+            "total_votes_for": cls._pyval(root, "TOTAL_VOTES_FOR"),
+            "total_votes_against": cls._pyval(root, "TOTAL_VOTES_AGAINST"),
+            "total_nations_for": cls._pyval(root, "TOTAL_NATIONS_FOR"),
+            "total_nations_against": cls._pyval(root, "TOTAL_NATIONS_AGAINST"),
+            "delvotes_for": delvotes["for"],
+            "delvotes_against": delvotes["against"],
+            # I can only blame my own buggy code for the following
+            "repealed_by": cls._pyval(root, "REPEALED_BY"),
+            "repeals": cls._pyval(root, "REPEALS_COUNCILID"),
+            "author": None,
+        }
+
+    async def _resolution_author(
+        self, nation: str, *, priority: Priority = Priority.INTERACTIVE
+    ) -> Optional[dict]:
+        try:
+            root = await self._request("fullname flag", nation=nation, priority=priority)
+        except NotFound:
+            return None
+        return {"fullname": root.FULLNAME.text, "flag": root.FLAG.text}
+
+    async def _fetch_resolution(
+        self, council: int, res_id: int, *, priority: Priority = Priority.INTERACTIVE
+    ) -> Optional[dict]:
+        root = await self._request(
+            {"wa": str(council), "id": str(res_id)}, q="resolution", priority=priority
+        )
+        if not root.RESOLUTION:
+            return None
+        data = self._resolution_data(root.RESOLUTION)
+        data["author"] = await self._resolution_author(data["proposed_by"], priority=priority)
+        self.resolutions.put(council, res_id, data)
+        return data
+
+    async def _revalidate_resolution(self, council: int, res_id: int):
+        try:
+            await self._fetch_resolution(council, res_id, priority=Priority.BACKGROUND)
+        except Exception:
+            log.exception("Failed to revalidate resolution %s of council %s", res_id, council)
+
+    async def _past_resolution(
+        self, council: int, res_id: int, *, priority: Priority = Priority.INTERACTIVE
+    ) -> Optional[dict]:
+        # passed resolutions only ever change by being repealed, so serve them locally
+        data, stale = self.resolutions.get(council, res_id)
+        if data is None:
+            return await self._fetch_resolution(council, res_id, priority=priority)
+        if stale:
+            self.bot.loop.create_task(self._revalidate_resolution(council, res_id))
+        return data
+
+    @staticmethod
+    def _tally(yes: int, no: int) -> str:
+        percent = 100 * yes / (yes + no) if yes + no else 0
+        return "For {}\t{:◄<13}\t{} Against".format(
+            yes, "►" * int(round(percent / 10)) + str(int(round(percent))) + "%", no
+        )
+
     @commands.command(aliases=["ga", "sc"])
     async def wa(self, ctx, resolution_id: Optional[int] = None, *options: WA.convert):
         """
@@ -528,53 +1181,133 @@ class NationStates(commands.Cog):
             votes - The total votes for and against
             nations - The total nations for and against
             delegates - The top ten Delegates for and against
+            chart - The votes over time, as recorded by the bot while it was at vote
         """
         option = WA.collapse(*options, default=0)
         if resolution_id and option & (WA.NATION | WA.DELEGATE):
             return await ctx.send(
                 "The Nations and Delegates options are not available for past resolutions."
             )
+        await self._send_resolution(ctx, resolution_id, option)
+
+    async def _send_resolution(
+        self,
+        ctx,
+        resolution_id: Optional[int],
+        option: WA,
+        *,
+        priority: Priority = Priority.INTERACTIVE,
+    ):
         is_sc = ctx.invoked_with == "sc"
-        shards = ["resolution"]
-        request = {"wa": "2" if is_sc else "1"}
-        if option & WA.DELEGATE:
-            shards.append("delvotes")
+        council = 2 if is_sc else 1
+        key = embed = None
         if resolution_id:
-            request["id"] = str(resolution_id)
+            res = await self._past_resolution(council, resolution_id, priority=priority)
+            if res is None:
+                return await ctx.send(f"No such resolution: {resolution_id}.")
+            promoted = res["promoted"]
         else:
-            shards.append("lastresolution")
-        root = await Api(request, q=shards)
-        if not root.RESOLUTION:
-            out = (
-                unescape(root.LASTRESOLUTION.pyval)
-                .replace("<strong>", "**")
-                .replace("</strong>", "**")
-            )
-            try:
-                out = "{}[{}](https://www.nationstates.net{}){}".format(
-                    out[: out.index("<a")],
-                    out[out.index('">') + 2 : out.index("</a")],
-                    out[out.index('="') + 2 : out.index('">')],
-                    out[out.index("</a>") + 4 :],
+            # kept fresh in the background; only go to the API if that's fallen behind
+            at_vote = self.at_vote.get(council)
+            if at_vote:
+                root = at_vote.root
+            else:
+                shards = ["resolution", "lastresolution"]
+                if option & WA.DELEGATE:
+                    shards.append("delvotes")
+                root = await self._request({"wa": str(council)}, q=shards, priority=priority)
+            if not root.RESOLUTION:
+                out = (
+                    unescape(root.LASTRESOLUTION.pyval)
+                    .replace("<strong>", "**")
+                    .replace("</strong>", "**")
                 )
-            except ValueError:
-                pass
-            embed = ProxyEmbed(
-                title="Last Resolution", description=out, colour=await ctx.embed_colour()
-            )
-            embed.set_thumbnail(
-                url="https://www.nationstates.net/images/{}.jpg".format("sc" if is_sc else "ga")
-            )
-            return await embed.send_to(ctx)
-        root = root.RESOLUTION
+                try:
+                    out = "{}[{}](https://www.nationstates.net{}){}".format(
+                        out[: out.index("<a")],
+                        out[out.index('">') + 2 : out.index("</a")],
+                        out[out.index('="') + 2 : out.index('">')],
+                        out[out.index("</a>") + 4 :],
+                    )
+                except ValueError:
+                    pass
+                embed = ProxyEmbed(
+                    title="Last Resolution", description=out, colour=await ctx.embed_colour()
+                )
+                embed.set_thumbnail(
+                    url="https://www.nationstates.net/images/{}.jpg".format(
+                        "sc" if is_sc else "ga"
+                    )
+                )
+                return await embed.send_to(ctx)
+            promoted = root.RESOLUTION.PROMOTED.pyval
+            key = ("wa", council, option, await ctx.embed_colour())
+            embed = self.rendered.get(key, root)
+            if embed is not None:
+                self.metrics.incr("render_hit")
+            else:
+                res = self._resolution_data(root.RESOLUTION)
+                if at_vote:
+                    res["author"] = at_vote.author
+                else:
+                    res["author"] = await self._resolution_author(
+                        res["proposed_by"], priority=priority
+                    )
+        if embed is None:
+            with self.metrics.timer("render", "resolution"):
+                embed = await self._resolution_embed(ctx, res, council, resolution_id, option)
+            if key:
+                self.rendered.set(key, root, embed)
+        await embed.send_to(ctx)
+        if option & WA.CHART:
+            await self._send_vote_chart(ctx, council, promoted, quiet=option == WA.ALL)
+
+    def _record_votes(self, council: int, root):
+        if not self.votes:
+            return
+        taken = VoteLog.sample(root)
+        if taken:
+            self.bot.loop.create_task(self._append_votes(council, *taken))
+
+    async def _append_votes(self, council: int, promoted: int, sample):
+        try:
+            await self.bot.loop.run_in_executor(None, self.votes.append, council, promoted, sample)
+        except OSError:
+            log.exception("Could not record the votes on council %s", council)
+
+    async def _send_vote_chart(self, ctx, council: int, promoted: Optional[int], *, quiet: bool):
+        samples = (
+            await self.bot.loop.run_in_executor(None, self.votes.read, council, promoted)
+            if promoted
+            else []
+        )
+        if len(samples) < 2:
+            if not quiet:
+                await ctx.send("Not enough votes have been recorded to chart this resolution.")
+            return
+        with self.metrics.timer("render", "chart"):
+            png, top = await self.bot.loop.run_in_executor(None, vote_chart, samples)
+        await ctx.send(
+            "Votes (bright) and nations (dim) for and against, from {:%Y-%m-%d %H:%M} "
+            "to {:%Y-%m-%d %H:%M} UTC. The top of the chart is {}.".format(
+                datetime.utcfromtimestamp(samples[0].timestamp),
+                datetime.utcfromtimestamp(samples[-1].timestamp),
+                top,
+            ),
+            file=discord.File(BytesIO(png), "votes.png"),
+        )
+
+    async def _resolution_embed(
+        self, ctx, res: dict, council: int, resolution_id: Optional[int], option: WA
+    ) -> ProxyEmbed:
         img = {
             "Commendation": "images/commend.png",
             "Condemnation": "images/condemn.png",
             "Liberation": "images/liberate.png",
-        }.get(root.CATEGORY.pyval, "images/ga.jpg")
+        }.get(res["category"], "images/ga.jpg")
         if option & WA.TEXT:
             description = "**Category: {}**\n\n{}".format(
-                root.CATEGORY.pyval, escape(root.DESC.pyval, formatting=True)
+                res["category"], escape(res["desc"], formatting=True)
             )
             short = next(
                 pagify(
@@ -588,122 +1321,173 @@ class NationStates(commands.Cog):
             if len(short) < len(description):
                 description = short + "\N{HORIZONTAL ELLIPSIS}"
         else:
-            description = "Category: {}".format(root.CATEGORY.pyval)
+            description = "Category: {}".format(res["category"])
         if resolution_id:
-            impl = root.IMPLEMENTED.pyval
+            impl = res["implemented"]
         else:
             # mobile embeds can't handle the FUTURE
-            impl = root.PROMOTED.pyval  # + (4 * 24 * 60 * 60)  # 4 Days
+            impl = res["promoted"]  # + (4 * 24 * 60 * 60)  # 4 Days
         embed = ProxyEmbed(
-            title=root.NAME.pyval,
-            url="https://www.nationstates.net/page={}".format("sc" if is_sc else "ga")
+            title=res["name"],
+            url="https://www.nationstates.net/page={}".format("sc" if council == 2 else "ga")
             if not resolution_id
             else "https://www.nationstates.net/page=WA_past_resolution/id={}/council={}".format(
-                resolution_id, "2" if is_sc else "1"
+                resolution_id, council
             ),
             description=description,
             timestamp=datetime.utcfromtimestamp(impl),
             colour=await ctx.embed_colour(),
         )
-        try:
-            authroot = await Api("fullname flag", nation=root.PROPOSED_BY.pyval)
-        except NotFound:
+        author = res["author"]
+        if author is None:
             embed.set_author(
-                name=root.PROPOSED_BY.text.replace("_", " ").title(),
+                name=res["proposed_by"].replace("_", " ").title(),
                 url="https://www.nationstates.net/page=boneyard?nation={}".format(
-                    root.PROPOSED_BY.pyval
+                    res["proposed_by"]
                 ),
                 icon_url="http://i.imgur.com/Pp1zO19.png",
             )
         else:
             embed.set_author(
-                name=authroot.FULLNAME.pyval,
-                url="https://www.nationstates.net/nation={}".format(root.PROPOSED_BY.pyval),
-                icon_url=authroot.FLAG.pyval,
+                name=author["fullname"],
+                url="https://www.nationstates.net/nation={}".format(res["proposed_by"]),
+                icon_url=author["flag"],
             )
         embed.set_thumbnail(url="https://www.nationstates.net/{}".format(img))
         if option & WA.DELEGATE:
-            for_del_votes = sorted(
-                root.iterfind("DELVOTES_FOR/DELEGATE"), key=lambda e: e.VOTES.pyval, reverse=True
-            )[:10]
-            against_del_votes = sorted(
-                root.iterfind("DELVOTES_AGAINST/DELEGATE"),
-                key=lambda e: e.VOTES.pyval,
-                reverse=True,
-            )[:10]
-            if for_del_votes:
-                embed.add_field(
-                    name="Top Delegates For",
-                    value="\t|\t".join(
-                        "[{}](https://www.nationstates.net/nation={}) ({})".format(
-                            e.NATION.text.replace("_", " ").title(), e.NATION.pyval, e.VOTES.pyval
-                        )
-                        for e in for_del_votes
-                    ),
-                    inline=False,
-                )
-            if against_del_votes:
-                embed.add_field(
-                    name="Top Delegates Against",
-                    value="\t|\t".join(
-                        "[{}](https://www.nationstates.net/nation={}) ({})".format(
-                            e.NATION.text.replace("_", " ").title(), e.NATION.pyval, e.VOTES.pyval
-                        )
-                        for e in against_del_votes
-                    ),
-                    inline=False,
-                )
+            for side in ("for", "against"):
+                if res[f"delvotes_{side}"]:
+                    embed.add_field(
+                        name=f"Top Delegates {side.title()}",
+                        value="\t|\t".join(
+                            "[{}](https://www.nationstates.net/nation={}) ({})".format(
+                                nation.replace("_", " ").title(), nation, votes
+                            )
+                            for nation, votes in res[f"delvotes_{side}"]
+                        ),
+                        inline=False,
+                    )
         if option & WA.VOTE:
-            percent = (
-                100
-                * root.TOTAL_VOTES_FOR.pyval
-                / (root.TOTAL_VOTES_FOR.pyval + root.TOTAL_VOTES_AGAINST.pyval)
-            )
             embed.add_field(
                 name="Total Votes",
-                value="For {}\t{:◄<13}\t{} Against".format(
-                    root.TOTAL_VOTES_FOR.pyval,
-                    "►" * int(round(percent / 10)) + str(int(round(percent))) + "%",
-                    root.TOTAL_VOTES_AGAINST.pyval,
-                ),
+                value=self._tally(res["total_votes_for"], res["total_votes_against"]),
                 inline=False,
             )
         if option & WA.NATION:
-            percent = (
-                100
-                * root.TOTAL_NATIONS_FOR.pyval
-                / (root.TOTAL_NATIONS_FOR.pyval + root.TOTAL_NATIONS_AGAINST.pyval)
-            )
             embed.add_field(
                 name="Total Nations",
-                value="For {}\t{:◄<13}\t{} Against".format(
-                    root.TOTAL_NATIONS_FOR.pyval,
-                    "►" * int(round(percent / 10)) + str(int(round(percent))) + "%",
-                    root.TOTAL_NATIONS_AGAINST.pyval,
-                ),
+                value=self._tally(res["total_nations_for"], res["total_nations_against"]),
                 inline=False,
             )
-        # I can only blame my own buggy code for the following
-        repealed_by = root.find("REPEALED_BY")
-        if repealed_by is not None:
+        if res["repealed_by"] is not None:
             embed.add_field(
                 name="Repealed By",
                 value='[Repeal "{}"](https://www.nationstates.net/page=WA_past_resolution/id={}/council={})'.format(
-                    root.NAME.pyval, root.REPEALED_BY.pyval, "2" if is_sc else "1"
+                    res["name"], res["repealed_by"], council
                 ),
                 inline=False,
             )
-        repeals = root.find("REPEALS_COUNCILID")
-        if repeals is not None:
+        if res["repeals"] is not None:
             embed.add_field(
                 name="Repeals",
                 value="[{}](https://www.nationstates.net/page=WA_past_resolution/id={}/council={})".format(
-                    root.NAME.pyval[8:-1], repeals, "2" if is_sc else "1"
+                    res["name"][8:-1], res["repeals"], council
                 ),
                 inline=False,
             )
         embed.set_footer(text="Passed" if resolution_id else "Voting Started")
-        await embed.send_to(ctx)
+        return embed
+
+    # __________ CENSUS __________
+
+    @commands.group()
+    async def census(self, ctx):
+        """Bulk access to NationStates census data."""
+        pass
+
+    @census.command(name="export", usage="<scales> <targets...>")
+    async def census_export(self, ctx, scales: scale_ids, *, targets: census_targets):
+        """
+        Exports census scores of many nations as a CSV file.
+
+        scales: Census scale IDs, separated by commas, e.g. 65,66
+        targets: Nations, separated by commas. Regions can be included
+        with a region link or with region:name, and export all of their residents.
+
+        Examples:
+            [p]census export 65,66 Darcania, Testlandia
+            [p]census export "0 46 65" region:10000 Islands
+        """
+        nations = []
+        for kind, name in targets:
+            if kind == "region":
+                try:
+                    residents = await self.index.region(name)
+                except NotFound:
+                    return await ctx.send(f"Region {name!r} does not exist.")
+                nations.extend(sorted(residents))
+            else:
+                nations.append(name)
+        nations = list(dict.fromkeys(nations))
+        if len(nations) > MAX_EXPORT:
+            return await ctx.send(
+                f"That's {len(nations)} nations. I can only export {MAX_EXPORT} at a time."
+            )
+        scale = " ".join(map(str, scales))
+        if len(nations) > self.scheduler.limit:
+            eta = len(nations) * self.scheduler.period / self.scheduler.limit
+            await ctx.send(
+                f"Exporting {len(nations)} nations. This will take at least {eta:.0f} seconds."
+            )
+
+        async def fetch(nation):
+            # one-off reads; sent directly so they neither fill the shared cache
+            # nor outlive the export if it's cancelled
+            try:
+                return await self._send(
+                    Priority.BACKGROUND, "census", nation=nation, scale=scale, mode="score"
+                )
+            except NotFound:
+                return None
+
+        buffer = BytesIO()
+        text = TextIOWrapper(buffer, encoding="utf-8", newline="")
+        writer = csv.writer(text)
+        writer.writerow(["nation", *scales])
+        missing = failed = 0
+        tasks = [asyncio.ensure_future(fetch(n)) for n in nations]
+        try:
+            async with ctx.typing():
+                # rows are written in order, as soon as the nations before them are done,
+                # so exports of the same nations can be diffed
+                for nation, task in zip(nations, tasks):
+                    try:
+                        root = await task
+                    except (HTTPException, asyncio.TimeoutError) as e:
+                        # one bad response shouldn't throw away every other nation's scores
+                        log.debug("Could not export the census of %s: %r", nation, e)
+                        failed += 1
+                        continue
+                    if root is None:
+                        missing += 1
+                        continue
+                    scores = {
+                        int(e.get("id")): e.SCORE.pyval for e in root.iterfind("CENSUS/SCALE")
+                    }
+                    writer.writerow([nation, *(scores.get(s, "") for s in scales)])
+                text.flush()
+                text.detach()
+                buffer.seek(0)
+        finally:
+            # if one request failed, the rest shouldn't keep spending the rate limit
+            for task in tasks:
+                task.cancel()
+        message = f"Census scores of {len(nations) - missing - failed} nations."
+        if missing:
+            message += f" {missing} nations no longer exist and were skipped."
+        if failed:
+            message += f" {failed} nations could not be fetched and were left out."
+        await ctx.send(message, file=discord.File(buffer, "census.csv"))
 
     # __________ SHARD __________
 
@@ -737,7 +1521,7 @@ class NationStates(commands.Cog):
                 key = "q"
         if key != "q":
             return await ctx.send("No value provided for key {!r}".format(key))
-        root = await Api(**request)
+        root = await self._request(**request)
         await ctx.send_interactive(pagify(pretty_string(root), shorten_by=11), "xml")
 
     # __________ ENDORSE __________
@@ -745,20 +1529,35 @@ class NationStates(commands.Cog):
     @commands.command()
     async def ne(self, ctx, *, wa_nation: str):
         """Nations Endorsing (NE) the specified WA nation"""
-        root = await Api("endorsements fullname wa", nation=wa_nation)
-        if root.UNSTATUS.pyval.lower() == "non-member":
-            return await ctx.send(f"{root.FULLNAME.pyval} is not a WA member.")
-        if not root.ENDORSEMENTS.pyval:
-            return await ctx.send(f"{root.FULLNAME.pyval} has no endorsements.")
-        await ctx.send(
-            "Nations endorsing " + root.FULLNAME.pyval,
-            file=discord.File(BytesIO(root.ENDORSEMENTS.pyval.encode()), "ne.txt"),
-        )
+        parser = ListShardParser("ENDORSEMENTS", ",", capture=("FULLNAME", "UNSTATUS"))
+        buffer = BytesIO()
+        async for names in self._stream(
+            parser, q="endorsements fullname wa", nation=normalize(wa_nation)
+        ):
+            if buffer.tell():
+                buffer.write(b",")
+            buffer.write(",".join(names).encode())
+        fullname = parser.values.get("FULLNAME", wa_nation)
+        if parser.values.get("UNSTATUS", "").lower() == "non-member":
+            return await ctx.send(f"{fullname} is not a WA member.")
+        if not buffer.tell():
+            return await ctx.send(f"{fullname} has no endorsements.")
+        buffer.seek(0)
+        await ctx.send("Nations endorsing " + fullname, file=discord.File(buffer, "ne.txt"))
 
     @commands.command()
     async def nec(self, ctx, *, wa_nation: str):
         """Nations Endorsing [Count] (NEC) the specified WA nation"""
-        root = await Api("census fullname wa", nation=wa_nation, scale="66", mode="score")
+        row, root = await self._dump_or_request(
+            "nation", normalize(wa_nation), "census fullname wa", scale="66", mode="score"
+        )
+        if row is not None:
+            if (row["unstatus"] or "").lower() == "non-member":
+                return await ctx.send(f"{row['fullname']} is not a WA member.")
+            endo = len(row["endorsements"].split(",")) if row["endorsements"] else 0
+            return await ctx.send(
+                "{} nations were endorsing {} as of the daily dump".format(endo, row["fullname"])
+            )
         if root.UNSTATUS.pyval.lower() == "non-member":
             return await ctx.send(f"{root.FULLNAME.pyval} is not a WA member.")
         await ctx.send(
@@ -770,7 +1569,7 @@ class NationStates(commands.Cog):
     @commands.command()
     async def spdr(self, ctx, *, nation: str):
         """Soft Power Disbursement Rating (SPDR, aka numerical Influence) of the specified nation"""
-        root = await Api("census fullname", nation=nation, scale="65", mode="score")
+        root = await self._request("census fullname", nation=nation, scale="65", mode="score")
         await ctx.send(
             "{} has {:.0f} influence".format(
                 root.FULLNAME.pyval, root.find(".//SCALE[@id='65']/SCORE").pyval
@@ -780,15 +1579,16 @@ class NationStates(commands.Cog):
     @commands.command()
     async def nne(self, ctx, *, wa_nation: str):
         """Nations Not Endorsing (NNE) the specified WA nation"""
-        nation_root = await Api("endorsements fullname region wa", nation=wa_nation)
+        row, nation_root = await self._dump_or_request(
+            "nation", normalize(wa_nation), "endorsements fullname region wa"
+        )
+        if row is not None:
+            return await self._send_dump_nne(ctx, row)
         if nation_root.UNSTATUS.pyval.lower() == "non-member":
             return await ctx.send(f"{nation_root.FULLNAME.pyval} is not a WA member.")
-        wa_root = await Api("members", wa="1")
-        region_root = await Api("nations", region=nation_root.REGION.pyval)
-        final = (
-            set(region_root.NATIONS.pyval.split(":"))
-            .intersection(wa_root.MEMBERS.pyval.split(","))
-            .difference((nation_root.ENDORSEMENTS.pyval or "").split(","))
+        region = await self.index.region(nation_root.REGION.pyval)
+        final = region.intersection(await self.index.members()).difference(
+            (nation_root.ENDORSEMENTS.pyval or "").split(",")
         )
         await ctx.send(
             "Nations not endorsing " + nation_root.FULLNAME.pyval,
@@ -798,16 +1598,195 @@ class NationStates(commands.Cog):
     @commands.command()
     async def nnec(self, ctx, *, wa_nation: str):
         """Nations Not Endorsing [Count] (NNEC) the specified WA nation"""
-        nation_root = await Api("endorsements fullname region wa", nation=wa_nation)
+        row, nation_root = await self._dump_or_request(
+            "nation", normalize(wa_nation), "endorsements fullname region wa"
+        )
+        if row is not None:
+            return await self._send_dump_nne(ctx, row, count_only=True)
         if nation_root.UNSTATUS.pyval.lower() == "non-member":
             return await ctx.send(f"{nation_root.NAME.pyval} is not a WA member.")
-        wa_root = await Api("members", wa="1")
-        region_root = await Api("nations", region=nation_root.REGION.pyval)
-        final = (
-            set(region_root.NATIONS.pyval.split(":"))
-            .intersection(wa_root.MEMBERS.pyval.split(","))
-            .difference((nation_root.ENDORSEMENTS.pyval or "").split(","))
+        region = await self.index.region(nation_root.REGION.pyval)
+        final = region.intersection(await self.index.members()).difference(
+            (nation_root.ENDORSEMENTS.pyval or "").split(",")
         )
         await ctx.send(
             "{:.0f} nations are not endorsing {}".format(len(final), nation_root.FULLNAME.pyval)
         )
+
+    # __________ DUMP __________
+
+    @commands.group(invoke_without_command=True)
+    async def nsdump(self, ctx):
+        """
+        Answers from the local copy of the NationStates daily dumps
+
+        These are up to a day old, but never touch the API.
+        """
+        rows = self._dump_lookup("status")
+        if rows is None:
+            return await ctx.send("The dump could not be read.")
+        if not rows:
+            return await ctx.send(
+                f"No dumps have been ingested yet. The bot owner can use `{ctx.clean_prefix}nsdump ingest`."
+            )
+        await ctx.send(
+            box(
+                "\n".join(
+                    "{:<8} {:>7} rows, ingested {:%Y-%m-%d %H:%M} UTC".format(
+                        row["kind"], row["rows"], datetime.utcfromtimestamp(row["at"])
+                    )
+                    for row in rows
+                )
+            )
+        )
+
+    @nsdump.command(name="ingest")
+    @checks.is_owner()
+    async def nsdump_ingest(self, ctx, *, path: Path):
+        """
+        Loads a nations or regions dump into the local store
+
+        The path is read on the bot's machine and may be gzipped.
+        Download the dumps from https://www.nationstates.net/pages/api.html#dumps
+        """
+        if not path.is_file():
+            return await ctx.send(f"No file found at `{path}`.")
+        async with ctx.typing():
+            try:
+                kind, count = await self.bot.loop.run_in_executor(None, self.dump.ingest, path)
+            except (OSError, ValueError, etree.XMLSyntaxError, sqlite3.Error) as e:
+                return await ctx.send(f"Could not ingest `{path}`: {e}")
+        await ctx.send(f"Ingested {count} {kind}.")
+
+    @nsdump.command(name="prefer")
+    @checks.is_owner()
+    async def nsdump_prefer(self, ctx, prefer: bool = None):
+        """
+        Toggles answering nation, region, nec, nne and nnec from the dump first
+
+        When off, the dump is still used if the API errors or times out.
+        Nations and regions missing from the dump are always looked up live.
+        """
+        if prefer is None:
+            prefer = not self.prefer_dump
+        await self.config.prefer_dump.set(prefer)
+        self.prefer_dump = prefer
+        await ctx.send(
+            "Those commands will now answer from the {} first.".format(
+                "daily dump" if prefer else "API"
+            )
+        )
+
+    @nsdump.command(name="nation")
+    async def nsdump_nation(self, ctx, *, nation: Link[Nation]):
+        """Retrieves general info about the specified nation from the daily dump"""
+        row = self._dump_lookup("nation", nation)
+        if row is None:
+            return await ctx.send("That nation is not in the dump.")
+        await (await self._dump_nation_embed(ctx, row)).send_to(ctx)
+
+    async def _dump_nation_embed(self, ctx, row: sqlite3.Row) -> ProxyEmbed:
+        endo = len(row["endorsements"].split(",")) if row["endorsements"] else 0
+        embed = ProxyEmbed(
+            title=row["fullname"],
+            url="https://www.nationstates.net/nation={}".format(row["id"]),
+            description="[{}](https://www.nationstates.net/region={}) | {} | Founded {}".format(
+                row["region_name"],
+                row["region"],
+                self._illion(row["population"] or 0),
+                row["founded"] or "in Antiquity",
+            ),
+            colour=await ctx.embed_colour(),
+        )
+        embed.set_author(name="NationStates", url="https://www.nationstates.net/")
+        if row["flag"]:
+            embed.set_thumbnail(url=row["flag"])
+        embed.add_field(
+            name="Category",
+            value="{}\n{}".format(row["category"] or "Unknown", row["motto"] or ""),
+            inline=False,
+        )
+        embed.add_field(
+            name=row["unstatus"] or "Non-member",
+            value="{} endorsement{} | {} influence".format(
+                endo, "" if endo == 1 else "s", row["influence"]
+            ),
+            inline=False,
+        )
+        if row["lastlogin"]:
+            embed.timestamp = datetime.utcfromtimestamp(row["lastlogin"])
+            embed.set_footer(text="From the daily dump | Last Active")
+        else:
+            embed.set_footer(text="From the daily dump")
+        return embed
+
+    @nsdump.command(name="region")
+    async def nsdump_region(self, ctx, *, region: Link[Region]):
+        """Retrieves general info about the specified region from the daily dump"""
+        row = self._dump_lookup("region", region)
+        if row is None:
+            return await ctx.send("That region is not in the dump.")
+        await (await self._dump_region_embed(ctx, row)).send_to(ctx)
+
+    async def _dump_region_embed(self, ctx, row: sqlite3.Row) -> ProxyEmbed:
+        if row["delegate"]:
+            delvalue = "[{}](https://www.nationstates.net/nation={}) | {} endorsements".format(
+                row["delegate"].replace("_", " ").title(),
+                row["delegate"],
+                (row["delegatevotes"] or 1) - 1,
+            )
+        else:
+            delvalue = "No Delegate"
+        if row["founder"]:
+            foundervalue = "[{}](https://www.nationstates.net/nation={})".format(
+                row["founder"].replace("_", " ").title(), row["founder"]
+            )
+        else:
+            foundervalue = "No Founder"
+        embed = ProxyEmbed(
+            title=row["name"],
+            url="https://www.nationstates.net/region={}".format(row["id"]),
+            description="[{} nations](https://www.nationstates.net/region={}/page=list_nations){}".format(
+                row["numnations"],
+                row["id"],
+                " | Power: {}".format(row["power"]) if row["power"] else "",
+            ),
+            colour=await ctx.embed_colour(),
+        )
+        embed.set_author(name="NationStates", url="https://www.nationstates.net/")
+        if row["flag"]:
+            embed.set_thumbnail(url=row["flag"])
+        embed.add_field(name="Founder", value=foundervalue, inline=False)
+        embed.add_field(name="Delegate", value=delvalue, inline=False)
+        if row["lastupdate"]:
+            embed.timestamp = datetime.utcfromtimestamp(row["lastupdate"])
+            embed.set_footer(text="From the daily dump | Last Updated")
+        else:
+            embed.set_footer(text="From the daily dump")
+        return embed
+
+    @nsdump.command(name="nne")
+    async def nsdump_nne(self, ctx, *, wa_nation: Link[Nation]):
+        """Nations Not Endorsing (NNE) the specified WA nation, from the daily dump"""
+        row = self._dump_lookup("nation", wa_nation)
+        if row is None:
+            return await ctx.send("That nation is not in the dump.")
+        await self._send_dump_nne(ctx, row)
+
+    async def _send_dump_nne(self, ctx, row: sqlite3.Row, *, count_only: bool = False):
+        if (row["unstatus"] or "").lower() == "non-member":
+            return await ctx.send(f"{row['fullname']} is not a WA member.")
+        residents = self._dump_lookup("wa_residents", row["region"])
+        if residents is None:
+            return await ctx.send("The dump could not be read.")
+        final: Set[str] = set(residents)
+        final.difference_update(row["endorsements"].split(","))
+        final.discard(row["id"])
+        message = "{} nations were not endorsing {} as of the daily dump".format(
+            len(final), row["fullname"]
+        )
+        if count_only:
+            return await ctx.send(message)
+        await ctx.send(
+            message, file=discord.File(BytesIO(",".join(sorted(final)).encode()), "nne.txt")
+        )
@@ -0,0 +1,45 @@
+import asyncio
+import logging
+from typing import Optional
+
+
+log = logging.getLogger("red.fluffy.nationstates.periodic")
+
+
+class PeriodicTask:
+    """
+    Calls ``tick`` every ``interval`` seconds in a background task, from ``start`` until ``stop``.
+
+    A tick that raises is logged, and the next one runs on schedule.
+    """
+
+    # whether the first tick runs straight away or only after one interval
+    tick_on_start = True
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        if not self._task:
+            self._task = loop.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def tick(self):
+        raise NotImplementedError
+
+    async def _run(self):
+        if not self.tick_on_start:
+            await asyncio.sleep(self.interval)
+        while True:
+            try:
+                await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("%s failed to refresh", type(self).__name__)
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,52 @@
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+
+class ResolutionIndex:
+    """
+    Passed WA resolutions, stored as rendered-ready dicts.
+
+    Repealed resolutions can never change again. Ones that haven't been repealed
+    are reported as stale after ``revalidate`` seconds so a repeal can be picked up.
+    """
+
+    def __init__(self, path: Path, *, revalidate: float = 7 * 24 * 60 * 60):
+        self.path = path
+        self.revalidate = revalidate
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def open(self):
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS resolutions ("
+            "council INTEGER NOT NULL, id INTEGER NOT NULL, fetched REAL NOT NULL, "
+            "data TEXT NOT NULL, PRIMARY KEY (council, id)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def close(self):
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+    def get(self, council: int, res_id: int) -> Tuple[Optional[dict], bool]:
+        row = self._conn.execute(
+            "SELECT fetched, data FROM resolutions WHERE council = ? AND id = ?", (council, res_id)
+        ).fetchone()
+        if row is None:
+            return None, False
+        fetched, data = row
+        data = json.loads(data)
+        stale = data["repealed_by"] is None and fetched < time.time() - self.revalidate
+        return data, stale
+
+    def put(self, council: int, res_id: int, data: dict):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO resolutions VALUES (?, ?, ?, ?)",
+            (council, res_id, time.time(), json.dumps(data, separators=(",", ":"))),
+        )
+        self._conn.commit()
@@ -0,0 +1,132 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Optional
+
+# pylint: disable=E0611
+from sans.api import Api
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+class Scheduler:
+    """
+    Hands out request slots within the NationStates rate limit.
+
+    Instead of failing once the limit is hit, requests queue up and are released
+    highest priority first as older requests fall out of the window.
+    Background requests always leave ``reserve`` slots free for interactive ones.
+    """
+
+    def __init__(self, limit: int = 50, period: float = 30, *, reserve: int = 10):
+        self.limit = limit
+        self.period = period
+        self.reserve = reserve
+        self._sent: "deque[float]" = deque()
+        self._waiters: list = []
+        self._counter = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # lockouts from responses that didn't go through sans
+        self._locked_until = 0.0
+
+    @property
+    def depth(self) -> int:
+        return sum(1 for *_, future in self._waiters if not future.done())
+
+    def _expire(self, now: float):
+        while self._sent and self._sent[0] <= now - self.period:
+            self._sent.popleft()
+
+    def _locked_for(self) -> float:
+        # Api.xra is set once NationStates has told us to back off
+        xra = max(Api.xra or 0, self._locked_until)
+        if not xra:
+            return 0
+        return max(0, xra - time.time())
+
+    def lock_out(self, seconds: float):
+        """Holds every request for this long, as NationStates asks with X-Retry-After."""
+        self._locked_until = max(self._locked_until, time.time() + seconds)
+        self._pump()
+
+    def estimate(self, priority: Priority = Priority.INTERACTIVE, count: int = 1) -> float:
+        """Roughly how long, in seconds, the last of ``count`` new requests would wait."""
+        now = time.monotonic()
+        self._expire(now)
+        ahead = sum(1 for p, _, f in self._waiters if p <= priority and not f.done())
+        position = ahead + max(count, 1) - 1
+        free = self.limit - len(self._sent)
+        if priority is Priority.BACKGROUND:
+            free -= self.reserve
+        wait = 0.0
+        if position >= free:
+            batches, index = divmod(position - max(free, 0), self.limit)
+            wait = self.period * batches
+            if index < len(self._sent):
+                wait += max(0, self._sent[index] + self.period - now)
+            else:
+                wait += self.period
+        return max(wait, self._locked_for())
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE):
+        await self.enqueue(priority)
+
+    def enqueue(self, priority: Priority = Priority.INTERACTIVE) -> asyncio.Future:
+        """Queues a request; the returned future resolves once it may be sent."""
+        future = asyncio.get_event_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        self._pump()
+        return future
+
+    def promote(self, future: asyncio.Future, priority: Priority):
+        """Moves a queued request up to a higher priority, behind older ones at that priority."""
+        for i, (queued, count, waiter) in enumerate(self._waiters):
+            if waiter is future:
+                if priority < queued and not future.done():
+                    self._waiters[i] = (priority, count, future)
+                    heapq.heapify(self._waiters)
+                    self._pump()
+                return
+
+    def _pump(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        self._expire(now)
+        locked = self._locked_for()
+        while self._waiters and not locked:
+            priority, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            limit = self.limit
+            if priority is Priority.BACKGROUND:
+                limit -= self.reserve
+            if len(self._sent) >= limit:
+                break
+            heapq.heappop(self._waiters)
+            self._sent.append(now)
+            future.set_result(None)
+        if self._waiters:
+            if locked:
+                delay = locked
+            elif self._sent:
+                delay = self._sent[0] + self.period - now
+            else:
+                delay = 0
+            self._timer = asyncio.get_event_loop().call_later(max(delay, 0.05), self._pump)
+
+    def close(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        for *_, future in self._waiters:
+            future.cancel()
+        self._waiters.clear()
@@ -0,0 +1,58 @@
+from typing import Dict, Iterable, List
+from xml.parsers import expat
+
+
+API_URL = "https://www.nationstates.net/cgi-bin/api.cgi"
+
+
+class ListShardParser:
+    """
+    Incrementally pulls the names out of a delimited list shard, like MEMBERS or NATIONS.
+
+    Character data is handled in whatever pieces expat hands over,
+    so the full list is never held as a single string.
+    The text of any tag in ``capture`` is kept in full in ``values``.
+    """
+
+    def __init__(self, tag: str, sep: str, *, capture: Iterable[str] = ()):
+        self.tag = tag
+        self.sep = sep
+        self.capture = frozenset(capture)
+        self.values: Dict[str, str] = {}
+        self._parser = expat.ParserCreate()
+        self._parser.buffer_text = False
+        self._parser.StartElementHandler = self._start
+        self._parser.EndElementHandler = self._end
+        self._parser.CharacterDataHandler = self._data
+        self._current = None
+        self._partial = ""
+        self._names: List[str] = []
+
+    def _start(self, name, attrs):
+        self._current = name
+        if name in self.capture:
+            self.values[name] = ""
+
+    def _end(self, name):
+        if name == self.tag and self._partial:
+            self._names.append(self._partial)
+            self._partial = ""
+        self._current = None
+
+    def _data(self, data: str):
+        if self._current == self.tag:
+            *names, self._partial = (self._partial + data).split(self.sep)
+            self._names.extend(filter(None, names))
+        elif self._current in self.capture:
+            self.values[self._current] += data
+
+    def feed(self, data: bytes) -> List[str]:
+        """Parses the next chunk of the response and returns the names completed by it."""
+        self._parser.Parse(data, False)
+        names, self._names = self._names, []
+        return names
+
+    def close(self) -> List[str]:
+        self._parser.Parse(b"", True)
+        names, self._names = self._names, []
+        return names
@@ -0,0 +1,99 @@
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class Sample(NamedTuple):
+    timestamp: int
+    votes_for: int
+    votes_against: int
+    nations_for: int
+    nations_against: int
+    delegates_for: int
+    delegates_against: int
+
+
+RECORD = struct.Struct("<7I")
+
+
+def _total(resolution, side: str) -> int:
+    return sum(e.VOTES.pyval for e in resolution.iterfind(f"DELVOTES_{side}/DELEGATE"))
+
+
+class VoteLog:
+    """
+    Append-only vote totals for each at-vote resolution, one file per resolution.
+
+    Every sample is a fixed-size little-endian record, and one is only
+    written when the totals have changed since the last.
+    Resolutions are keyed by council and the time they went to vote,
+    since they have no ID until they pass.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._last: Dict[Tuple[int, int], Sample] = {}
+        self._lock = threading.Lock()
+
+    def path(self, council: int, promoted: int) -> Path:
+        return self.directory / f"{council}-{promoted}.bin"
+
+    def _tail(self, council: int, promoted: int) -> Optional[Sample]:
+        try:
+            with self.path(council, promoted).open("rb") as file:
+                size = file.seek(0, 2)
+                if size < RECORD.size:
+                    return None
+                # a partial record from an interrupted write is ignored
+                file.seek(size - size % RECORD.size - RECORD.size)
+                return Sample._make(RECORD.unpack(file.read(RECORD.size)))
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def sample(root) -> Optional[Tuple[int, Sample]]:
+        """The promotion time and totals of a ``resolution delvotes`` response, if one is at vote."""
+        resolution = root.find("RESOLUTION")
+        if resolution is None or resolution.find("PROMOTED") is None:
+            return None
+        return (
+            resolution.PROMOTED.pyval,
+            Sample(
+                int(time.time()),
+                resolution.TOTAL_VOTES_FOR.pyval,
+                resolution.TOTAL_VOTES_AGAINST.pyval,
+                resolution.TOTAL_NATIONS_FOR.pyval,
+                resolution.TOTAL_NATIONS_AGAINST.pyval,
+                _total(resolution, "FOR"),
+                _total(resolution, "AGAINST"),
+            ),
+        )
+
+    def append(self, council: int, promoted: int, sample: Sample):
+        """Records a sample if the totals have changed. Blocks, so it's run in an executor."""
+        key = (council, promoted)
+        with self._lock:
+            last = self._last.get(key) or self._tail(council, promoted)
+            if last and last[1:] == sample[1:]:
+                return
+            with self.path(council, promoted).open("ab") as file:
+                size = file.seek(0, 2)
+                if size % RECORD.size:
+                    # drop the partial record so what follows stays aligned
+                    file.truncate(size - size % RECORD.size)
+                file.write(RECORD.pack(*sample))
+            self._last[key] = sample
+            # only the current vote of each council needs remembering
+            for other in [k for k in self._last if k[0] == council and k != key]:
+                del self._last[other]
+
+    def read(self, council: int, promoted: int) -> List[Sample]:
+        try:
+            data = self.path(council, promoted).read_bytes()
+        except FileNotFoundError:
+            return []
+        data = data[: len(data) - len(data) % RECORD.size]
+        return [Sample._make(values) for values in RECORD.iter_unpack(data)]
@@ -1,5 +1,7 @@
 from .rift import Rift
 
 
-def setup(bot):
-    bot.add_cog(Rift(bot))
+async def setup(bot):
+    cog = Rift(bot)
+    await cog.initialize()
+    bot.add_cog(cog)
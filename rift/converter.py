@@ -65,6 +65,7 @@ class RiftConverter(commands.Converter):
             raise commands.BadArgument(_("I don't have access to {} anymore.").format(result))
         source = ctx.channel if isinstance(ctx.channel, discord.TextChannel) else ctx.author
         rift = Rift(author=ctx.author, source=source, destination=destination)
+        ctx.cog.rehydrate(source)
         if rift in ctx.cog.open_rifts:
             raise commands.BadArgument(_("This rift already exists."))
         return rift
@@ -72,24 +73,41 @@ class RiftConverter(commands.Converter):
     @classmethod
     async def search(cls, ctx, argument, globally, _):
         is_owner = await ctx.bot.is_owner(ctx.author)
-        config = ctx.cog.config
-        guilds = ctx.bot.guilds.copy() if is_owner or globally else [ctx.guild]
+        cog = ctx.cog
+        index = cog.destinations
+        if not index.built:
+            index.build(ctx.bot.guilds)
+        scope = None if is_owner or globally else ctx.guild
+        allowed = {}
+
+        def guild_allowed(guild):
+            if scope is not None and guild != scope:
+                return False
+            if guild.id not in allowed:
+                allowed[guild.id] = cls.guild_filter(ctx, is_owner, guild)
+            return allowed[guild.id]
+
         result = set()
-        for guild in guilds:
-            if not await cls.guild_filter(ctx, is_owner, guild):
+        # the index narrows it down to a handful of candidates; the filters still have the final say
+        for channel_id in index.channels(argument):
+            channel = ctx.bot.get_channel(channel_id)
+            if not isinstance(channel, discord.TextChannel) or not guild_allowed(channel.guild):
+                continue
+            if cls.channel_filter(ctx, is_owner, channel, argument):
+                if channel.id not in cog.blacklisted_channels:
+                    result.add(channel)
+                else:
+                    log.debug("Channel %s ignored: blacklisted", channel.id)
+        for guild_id, user_id in index.members(argument):
+            guild = ctx.bot.get_guild(guild_id)
+            member = guild and guild.get_member(user_id)
+            if not member or not guild_allowed(guild):
                 continue
-            for channel in guild.text_channels.copy():
-                if cls.channel_filter(ctx, is_owner, channel, argument):
-                    if not await config.channel(channel).blacklisted():
-                        result.add(channel)
-                    else:
-                        log.debug("Channel %s ignored: blacklisted", channel.id)
-            for member in guild.members.copy():
-                if member not in result and cls.user_filter(ctx, is_owner, member, argument):
-                    if not await config.user(member).blacklisted():
-                        result.add(member)
-                    else:
-                        log.debug("User %s ignored: blacklisted", member.id)
+            if member not in result and cls.user_filter(ctx, is_owner, member, argument):
+                if member.id not in cog.blacklisted_users:
+                    result.add(member)
+                else:
+                    log.debug("User %s ignored: blacklisted", member.id)
         if not result:
             raise commands.BadArgument(
                 _(
@@ -99,8 +117,8 @@ class RiftConverter(commands.Converter):
         return list(result)
 
     @staticmethod
-    async def guild_filter(ctx, is_owner, guild):
-        if await ctx.cog.config.guild(guild).blacklisted():
+    def guild_filter(ctx, is_owner, guild):
+        if guild.id in ctx.cog.blacklisted_guilds:
             log.debug("Guild %s ignored: blacklisted", guild.id)
             return False
         if guild == ctx.guild:
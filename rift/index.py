@@ -0,0 +1,241 @@
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, MutableMapping, NamedTuple, Optional, Set, Tuple
+
+import discord
+
+from .converter import Rift
+from .mirror import MessageMap
+
+
+@dataclass
+class RiftRecord:
+    notify: bool = True
+    # relayed message ID -> its copy on the other side of the rift
+    messages: MessageMap = field(default_factory=MessageMap)
+
+
+class RiftIndex(MutableMapping[Rift, RiftRecord]):
+    """
+    The open rifts, indexed by the IDs of the channels or users on either end.
+
+    Lookups by channel hand back a snapshot list,
+    so callers can await and close rifts while walking it.
+    """
+
+    def __init__(self):
+        self._records: Dict[Rift, RiftRecord] = {}
+        # channel or user ID -> rifts, as insertion-ordered sets
+        self._sources: Dict[int, Dict[Rift, None]] = defaultdict(dict)
+        self._destinations: Dict[int, Dict[Rift, None]] = defaultdict(dict)
+
+    def __getitem__(self, rift: Rift) -> RiftRecord:
+        return self._records[rift]
+
+    def __setitem__(self, rift: Rift, record: RiftRecord):
+        self._records[rift] = record
+        self._sources[rift.source.id][rift] = None
+        self._destinations[rift.destination.id][rift] = None
+
+    def __delitem__(self, rift: Rift):
+        del self._records[rift]
+        for index, end in ((self._sources, rift.source), (self._destinations, rift.destination)):
+            rifts = index[end.id]
+            rifts.pop(rift, None)
+            if not rifts:
+                del index[end.id]
+
+    def __iter__(self) -> Iterator[Rift]:
+        return iter(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, rift) -> bool:
+        return rift in self._records
+
+    def sourced_from(self, channel: discord.abc.Snowflake) -> List[Rift]:
+        return list(self._sources.get(channel.id, ()))
+
+    def leading_to(self, channel: discord.abc.Snowflake) -> List[Rift]:
+        return list(self._destinations.get(channel.id, ()))
+
+    def connected(self, channel: discord.abc.Snowflake) -> List[Rift]:
+        """Every rift with this channel on either end, those it's the source of first."""
+        return self.sourced_from(channel) + self.leading_to(channel)
+
+
+class StoredRift(NamedTuple):
+    """An open rift as kept in the config: IDs only, plus which ends are users (DMs)."""
+
+    author: int
+    source: int
+    destination: int
+    notify: bool
+    source_is_user: bool
+    destination_is_user: bool
+
+    @classmethod
+    def from_rift(cls, rift: Rift, record: RiftRecord) -> "StoredRift":
+        return cls(
+            rift.author.id,
+            rift.source.id,
+            rift.destination.id,
+            record.notify,
+            isinstance(rift.source, discord.User),
+            isinstance(rift.destination, discord.User),
+        )
+
+    def resolve(self, bot) -> Optional[Rift]:
+        """The rift, or None if either end isn't available to the bot right now."""
+        source = bot.get_user(self.source) if self.source_is_user else bot.get_channel(self.source)
+        destination = (
+            bot.get_user(self.destination)
+            if self.destination_is_user
+            else bot.get_channel(self.destination)
+        )
+        if not source or not destination:
+            return None
+        guild = getattr(source, "guild", None)
+        author = (guild and guild.get_member(self.author)) or bot.get_user(self.author)
+        if not author:
+            return None
+        return Rift(author=author, source=source, destination=destination)
+
+
+CHANNEL_ID_RE = re.compile(r"<#(\d+)>$|(\d+)$")
+USER_ID_RE = re.compile(r"<@!?(\d+)>$|(\d+)$")
+
+
+def _discard(index: dict, key, value):
+    values = index.get(key)
+    if values is not None:
+        values.discard(value)
+        if not values:
+            del index[key]
+
+
+def _match_id(regex, argument: str) -> Set[int]:
+    match = regex.match(argument)
+    return {int(match.group(1) or match.group(2))} if match else set()
+
+
+class DestinationIndex:
+    """
+    Every text channel and member the bot can see, by the names a destination can be searched by.
+
+    IDs and mentions are parsed rather than indexed. It's built once,
+    on first use, and kept current by the cog's guild, channel and member listeners.
+    """
+
+    def __init__(self):
+        self.built = False
+        # channel name -> channel IDs
+        self._channels: Dict[str, Set[int]] = defaultdict(set)
+        # username and username#discriminator -> user IDs
+        self._users: Dict[str, Set[int]] = defaultdict(set)
+        # display name -> (guild ID, user ID)
+        self._nicks: Dict[str, Set[Tuple[int, int]]] = defaultdict(set)
+        # user ID -> IDs of the guilds they share with the bot
+        self._guilds: Dict[int, Set[int]] = defaultdict(set)
+
+    def build(self, guilds: Iterable[discord.Guild]):
+        for guild in guilds:
+            self.add_guild(guild)
+        self.built = True
+
+    def add_guild(self, guild: discord.Guild):
+        for channel in guild.text_channels:
+            self.add_channel(channel)
+        for member in guild.members:
+            self.add_member(member)
+
+    def remove_guild(self, guild: discord.Guild):
+        for channel in guild.text_channels:
+            self.remove_channel(channel)
+        for member in guild.members:
+            self.remove_member(member)
+
+    def add_channel(self, channel: discord.TextChannel):
+        self._channels[channel.name].add(channel.id)
+
+    def remove_channel(self, channel: discord.TextChannel):
+        _discard(self._channels, channel.name, channel.id)
+
+    @staticmethod
+    def _user_keys(user: discord.abc.User) -> Tuple[str, str]:
+        return user.name, f"{user.name}#{user.discriminator}"
+
+    def add_member(self, member: discord.Member):
+        self._guilds[member.id].add(member.guild.id)
+        for key in self._user_keys(member):
+            self._users[key].add(member.id)
+        self._nicks[member.display_name].add((member.guild.id, member.id))
+
+    def remove_member(self, member: discord.Member):
+        _discard(self._nicks, member.display_name, (member.guild.id, member.id))
+        _discard(self._guilds, member.id, member.guild.id)
+        if member.id not in self._guilds:
+            for key in self._user_keys(member):
+                _discard(self._users, key, member.id)
+
+    def update_user(self, before: discord.abc.User, after: discord.abc.User):
+        if before.id not in self._guilds:
+            return
+        for key in self._user_keys(before):
+            _discard(self._users, key, before.id)
+        for key in self._user_keys(after):
+            self._users[key].add(after.id)
+
+    def channels(self, argument: str) -> Set[int]:
+        return self._channels.get(argument, set()) | _match_id(CHANNEL_ID_RE, argument)
+
+    def members(self, argument: str) -> Set[Tuple[int, int]]:
+        """(guild ID, user ID) of every member the argument might refer to."""
+        users = self._users.get(argument, set()) | _match_id(USER_ID_RE, argument)
+        found = {
+            (guild_id, user_id) for user_id in users for guild_id in self._guilds.get(user_id, ())
+        }
+        found.update(self._nicks.get(argument, ()))
+        return found
+
+
+class PendingRifts:
+    """
+    Stored rifts that haven't been resolved since the cog loaded, by the IDs on either end.
+
+    Resolving waits for a message on one end, so loading doesn't look up every channel.
+    """
+
+    def __init__(self, stored: Iterable[StoredRift] = ()):
+        self._stored: Set[StoredRift] = set()
+        self._ends: Dict[int, Set[StoredRift]] = defaultdict(set)
+        for rift in stored:
+            self.add(rift)
+
+    def __iter__(self) -> Iterator[StoredRift]:
+        return iter(self._stored)
+
+    def __len__(self) -> int:
+        return len(self._stored)
+
+    def add(self, rift: StoredRift):
+        self._stored.add(rift)
+        self._ends[rift.source].add(rift)
+        self._ends[rift.destination].add(rift)
+
+    def discard(self, rift: StoredRift):
+        self._stored.discard(rift)
+        _discard(self._ends, rift.source, rift)
+        _discard(self._ends, rift.destination, rift)
+
+    def connected(self, end_id: int) -> List[StoredRift]:
+        return list(self._ends.get(end_id, ()))
+
+    def drop(self, *end_ids: int) -> bool:
+        """Discards every stored rift with an end among the IDs. Returns whether there were any."""
+        dropped = [rift for end_id in end_ids for rift in self.connected(end_id)]
+        for rift in dropped:
+            self.discard(rift)
+        return bool(dropped)
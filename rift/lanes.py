@@ -0,0 +1,46 @@
+import asyncio
+from typing import Dict, Hashable, Optional
+
+
+class Ticket:
+    """A place in line for one lane; ``async with`` waits for the holder before it."""
+
+    __slots__ = ("_lanes", "_key", "_previous", "_done")
+
+    def __init__(self, lanes: "Lanes", key: Hashable, previous: Optional[asyncio.Future]):
+        self._lanes = lanes
+        self._key = key
+        self._previous = previous
+        self._done = asyncio.get_event_loop().create_future()
+
+    async def __aenter__(self):
+        if self._previous is not None:
+            # only the ordering matters here, not whether the one before succeeded
+            await asyncio.wait((self._previous,))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+    def release(self):
+        if not self._done.done():
+            self._done.set_result(None)
+        if self._lanes._tails.get(self._key) is self._done:
+            del self._lanes._tails[self._key]
+
+
+class Lanes:
+    """
+    Orders work per key while letting different keys run concurrently.
+
+    ``reserve`` is synchronous, so calling it before the first ``await``
+    fixes a message's place in line for every destination at once.
+    """
+
+    def __init__(self):
+        self._tails: Dict[Hashable, asyncio.Future] = {}
+
+    def reserve(self, key: Hashable) -> Ticket:
+        ticket = Ticket(self, key, self._tails.get(key))
+        self._tails[key] = ticket._done
+        return ticket
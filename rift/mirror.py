@@ -0,0 +1,51 @@
+import time
+from collections import OrderedDict
+from typing import Iterator, Optional, Tuple
+
+from discord.utils import DISCORD_EPOCH
+
+# (channel ID, message ID) of a relayed copy
+Mirror = Tuple[int, int]
+
+
+class MessageMap:
+    """
+    Maps relayed message IDs to the IDs of their copies, for edits and deletes.
+
+    Only IDs are kept, and only for the newest ``maxsize`` messages
+    no older than ``max_age`` seconds. Snowflakes carry their own creation time,
+    so age is read off the key rather than stored.
+    """
+
+    def __init__(self, maxsize: int = 1000, max_age: float = 86400):
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self._mirrors: "OrderedDict[int, Mirror]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._mirrors)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._mirrors)
+
+    def __setitem__(self, message_id: int, mirror: Mirror):
+        self._mirrors[message_id] = mirror
+        self._mirrors.move_to_end(message_id)
+        self._evict()
+
+    def get(self, message_id: int) -> Optional[Mirror]:
+        self._evict()
+        return self._mirrors.get(message_id)
+
+    def pop(self, message_id: int) -> Optional[Mirror]:
+        self._evict()
+        return self._mirrors.pop(message_id, None)
+
+    def _evict(self):
+        mirrors = self._mirrors
+        while len(mirrors) > self.maxsize:
+            mirrors.popitem(last=False)
+        # the oldest ID that's still young enough; IDs arrive in (about) creation order
+        cutoff = int((time.time() - self.max_age) * 1000 - DISCORD_EPOCH) << 22
+        while mirrors and next(iter(mirrors)) < cutoff:
+            mirrors.popitem(last=False)
@@ -0,0 +1,35 @@
+from typing import Dict, Optional
+
+import discord
+
+
+class PermissionCache:
+    """
+    Computed permissions of users in rift destinations, by guild, then channel, then user.
+
+    The nesting follows what invalidates them: guild and role changes drop a guild,
+    overwrite changes drop a channel, and member changes drop a user across a guild.
+    """
+
+    def __init__(self):
+        self._guilds: Dict[int, Dict[int, Dict[int, discord.Permissions]]] = {}
+
+    def get(
+        self, channel: discord.abc.GuildChannel, user_id: int
+    ) -> Optional[discord.Permissions]:
+        return self._guilds.get(channel.guild.id, {}).get(channel.id, {}).get(user_id)
+
+    def set(self, channel: discord.abc.GuildChannel, user_id: int, perms: discord.Permissions):
+        self._guilds.setdefault(channel.guild.id, {}).setdefault(channel.id, {})[user_id] = perms
+
+    def forget_guild(self, guild_id: int):
+        self._guilds.pop(guild_id, None)
+
+    def forget_channel(self, guild_id: int, channel_id: int):
+        channels = self._guilds.get(guild_id)
+        if channels:
+            channels.pop(channel_id, None)
+
+    def forget_member(self, guild_id: int, user_id: int):
+        for users in self._guilds.get(guild_id, {}).values():
+            users.pop(user_id, None)
@@ -2,8 +2,9 @@ import asyncio
 import logging
 from contextlib import suppress
 from copy import copy
-from io import BytesIO
+from typing import Optional
 
+import aiohttp
 import discord
 
 from redbot.core import commands, checks, Config
@@ -11,6 +12,10 @@ from redbot.core.utils import common_filters, mod
 from redbot.core.utils.chat_formatting import pagify, humanize_list
 from redbot.core.i18n import Translator, cog_i18n
 from .converter import RiftConverter, search_converter
+from .index import DestinationIndex, PendingRifts, RiftIndex, RiftRecord, StoredRift
+from .lanes import Lanes
+from .permissions import PermissionCache
+from .spool import AttachmentSpool
 
 
 Cog = getattr(commands, "Cog", object)
@@ -46,13 +51,39 @@ class Rift(Cog):
     def __init__(self, bot):
         super().__init__()
         self.bot = bot
-        self.open_rifts = {}
+        self.open_rifts = RiftIndex()
+        # rifts from before the last reload, until a message on one end brings them back
+        self.pending = PendingRifts()
+        self.lanes = Lanes()
+        self.destinations = DestinationIndex()
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.perms = PermissionCache()
+        # blacklisted IDs, loaded once and kept in step with the config on every toggle
+        self.blacklisted_channels = set()
+        self.blacklisted_guilds = set()
+        self.blacklisted_users = set()
 
         self.config = Config.get_conf(self, identifier=2_113_674_295, force_registration=True)
         self.config.register_channel(blacklisted=False)
         self.config.register_guild(blacklisted=False)
         self.config.register_user(blacklisted=False)
-        self.config.register_global(notify=True)
+        self.config.register_global(notify=True, rifts=[])
+
+    async def initialize(self):
+        for blacklisted, data in (
+            (self.blacklisted_channels, await self.config.all_channels()),
+            (self.blacklisted_guilds, await self.config.all_guilds()),
+            (self.blacklisted_users, await self.config.all_users()),
+        ):
+            blacklisted.update(
+                key for key, settings in data.items() if settings.get("blacklisted")
+            )
+        self.pending = PendingRifts(StoredRift(*rift) for rift in await self.config.rifts())
+        self.session = aiohttp.ClientSession()
+
+    def cog_unload(self):
+        if self.session:
+            self.bot.loop.create_task(self.session.close())
 
     # COMMANDS
 
@@ -85,11 +116,12 @@ class Rift(Cog):
         if isinstance(ctx.channel, discord.DMChannel):
             channel = ctx.author
             group = self.config.user(channel)
+            ids = self.blacklisted_users
         else:
             channel = channel or ctx.channel
             group = self.config.channel(channel)
-        blacklisted = not await group.blacklisted()
-        await group.blacklisted.set(blacklisted)
+            ids = self.blacklisted_channels
+        blacklisted = await self._toggle_blacklist(group, ids, channel.id)
         await ctx.maybe_send_embed(
             _("Channel is {} blacklisted.".format("now" if blacklisted else "no longer"))
         )
@@ -106,15 +138,26 @@ class Rift(Cog):
         All channels and members in a server are considered blacklisted if the server is blacklisted.
         Members can still be reached if they are in another, non-blacklisted server.
         """
-        group = self.config.guild(ctx.guild)
-        blacklisted = not await group.blacklisted()
-        await group.blacklisted.set(blacklisted)
+        blacklisted = await self._toggle_blacklist(
+            self.config.guild(ctx.guild), self.blacklisted_guilds, ctx.guild.id
+        )
         await ctx.maybe_send_embed(
             _("Server is {} blacklisted.".format("now" if blacklisted else "no longer"))
         )
         if blacklisted:
             await self.close_rifts(ctx, ctx.author, ctx.guild)
 
+    @staticmethod
+    async def _toggle_blacklist(group, ids, id_):
+        blacklisted = id_ not in ids
+        await group.blacklisted.set(blacklisted)
+        # only touch the set once the config write went through
+        if blacklisted:
+            ids.add(id_)
+        else:
+            ids.discard(id_)
+        return blacklisted
+
     @rift.command(name="close")
     @commands.check(close_check)
     async def rift_close(self, ctx):
@@ -164,11 +207,12 @@ class Rift(Cog):
                     notify = True
             else:
                 notify = True
-            self.open_rifts[rift] = {"notify": notify}
+            self.open_rifts[rift] = RiftRecord(notify=notify)
             if notify:
                 ctx.bot.loop.create_task(
                     rift.destination.send(_("{} has opened a rift to here.").format(rift.author))
                 )
+        await self.save_rifts()
         await ctx.send(
             _(
                 "A rift has been opened to {}! Everything you say will be relayed there.\nResponses will be relayed here.\nType `exit` to quit."
@@ -190,6 +234,7 @@ class Rift(Cog):
             search = [ctx.author, ctx.channel, ctx.author]
         else:
             search = await RiftConverter.search(ctx, search, False, _)
+        self.rehydrate()
         results = set()
         for rift in self.open_rifts:
             for i in searchby:
@@ -204,22 +249,40 @@ class Rift(Cog):
 
     # UTILITIES
 
+    def rehydrate(self, channel=None):
+        """Brings back the stored rifts connected to the channel or user, or all of them."""
+        stored = self.pending.connected(channel.id) if channel else list(self.pending)
+        for entry in stored:
+            rift = entry.resolve(self.bot)
+            if rift is None:
+                # its guild may only be unavailable; the delete listeners drop it once it's gone
+                log.debug("Could not resolve stored rift %s yet", entry)
+                continue
+            self.pending.discard(entry)
+            self.open_rifts[rift] = RiftRecord(notify=entry.notify)
+
+    async def save_rifts(self):
+        stored = [StoredRift.from_rift(rift, record) for rift, record in self.open_rifts.items()]
+        stored.extend(self.pending)
+        await self.config.rifts.set([list(rift) for rift in stored])
+
     async def close_rifts(self, ctx, closer, destination):
         if isinstance(destination, discord.Guild):
-            check = lambda rift: rift.destination in destination.channels
+            for c in destination.channels:
+                self.rehydrate(c)
+            rifts = [r for c in destination.channels for r in self.open_rifts.leading_to(c)]
         else:
-            check = lambda rift: rift.destination == destination
-        noclose = True
-        for rift in self.open_rifts.copy():
-            if check(rift):
-                del self.open_rifts[rift]
-                noclose = False
-                await rift.source.send(
-                    _("{} has closed the rift to {}.").format(closer, rift.destination)
-                )
-                await rift.destination.send(_("Rift from {} closed.").format(rift.source))
-        if noclose:
-            await ctx.send(_("No rifts were found that connect to here."))
+            self.rehydrate(destination)
+            rifts = self.open_rifts.leading_to(destination)
+        rifts = [rift for rift in rifts if self.open_rifts.pop(rift, None)]
+        if not rifts:
+            return await ctx.send(_("No rifts were found that connect to here."))
+        await self.save_rifts()
+        for rift in rifts:
+            await rift.source.send(
+                _("{} has closed the rift to {}.").format(closer, rift.destination)
+            )
+            await rift.destination.send(_("Rift from {} closed.").format(rift.source))
 
     async def get_embed(self, destination, attachments):
         attach = attachments[0]
@@ -242,25 +305,31 @@ class Rift(Cog):
         if isinstance(destination, discord.User):
             return destination.dm_channel.permissions_for(user)
         if not is_owner:
-            member = destination.guild.get_member(user.id)
-            if member:
-                return destination.permissions_for(member)
-            else:
-                every = destination.guild.default_role
-                overs = destination.overwrites_for(every)
-                overs.read_messages = True
-                overs.send_messages = True
-                overs = overs.pair()
-                perms = (every.permissions.value & ~overs[1].value) | overs[0].value
-                log.debug(
-                    "calculated permissions for @everyone in server %s: %s",
-                    destination.guild.id,
-                    perms,
-                )
-                return discord.Permissions(perms)
+            # kept until a role, overwrite or member change in the destination's server
+            perms = self.perms.get(destination, user.id)
+            if perms is None:
+                perms = self._permissions(destination, user)
+                self.perms.set(destination, user.id, perms)
+            return perms
         return discord.Permissions.all()
 
-    async def process_message(self, rift, message, destination):
+    @staticmethod
+    def _permissions(destination, user):
+        member = destination.guild.get_member(user.id)
+        if member:
+            return destination.permissions_for(member)
+        every = destination.guild.default_role
+        overs = destination.overwrites_for(every)
+        overs.read_messages = True
+        overs.send_messages = True
+        overs = overs.pair()
+        perms = (every.permissions.value & ~overs[1].value) | overs[0].value
+        log.debug(
+            "calculated permissions for @everyone in server %s: %s", destination.guild.id, perms
+        )
+        return discord.Permissions(perms)
+
+    async def process_message(self, rift, message, destination, spool: AttachmentSpool):
         if isinstance(destination, discord.Message):
             send_coro = destination.edit
             log.debug("editing message %s-%s", destination.channel.id, destination.id)
@@ -291,8 +360,7 @@ class Rift(Cog):
         files = []
         embed = None
         if attachments and author_perms.attach_files and bot_perms.attach_files:
-            overs = [await self.save_attach(file, files) for file in attachments]
-            overs = list(filter(bool, overs))
+            files, overs = await spool.files()
             if overs:
                 if bot_perms.embed_links:
                     embed = await self.get_embed(destination, overs)
@@ -309,14 +377,68 @@ class Rift(Cog):
             content = f"{author}: {content}"
         return await send_coro(content=content, files=files, embed=embed)
 
-    async def save_attach(self, file: discord.Attachment, files) -> discord.File:
-        if sum((len(f.getbuffer()) for f in files)) + file.size > max_size:
-            log.debug("Attachment %r would exceed file size limits", file.filename)
-            return file
-        buffer = BytesIO()
-        await file.save(buffer, seek_begin=True)
-        files.append(discord.File(buffer, file.filename))
-        return None
+    def spool(self, message) -> AttachmentSpool:
+        return AttachmentSpool(self.session, message.attachments, max_size)
+
+    async def relay(self, ticket, message, rifts, destination, spool, report_to=None):
+        # rifts sharing a source and destination share a single relayed copy
+        async with ticket:
+            try:
+                rifted = await self.process_message(rifts[0], message, destination, spool)
+            except RiftError as e:
+                log.debug("Not relaying message %s: %s", message.id, e)
+                return
+            except discord.HTTPException as e:
+                if report_to is None:
+                    log.warning("Could not relay message %s to %s: %s", message.id, destination, e)
+                    return
+                with suppress(discord.HTTPException):
+                    await report_to.send(
+                        _("I couldn't send your message due to an error: {}").format(e)
+                    )
+                return
+            except Exception:
+                log.exception("Failed to relay message %s to %s", message.id, destination)
+                return
+            for rift in rifts:
+                record = self.open_rifts.get(rift)
+                if record is not None:
+                    record.messages[message.id] = (rifted.channel.id, rifted.id)
+
+    async def edit_mirror(self, ticket, rift, message, spool):
+        async with ticket:
+            record = self.open_rifts.get(rift)
+            mirror = record and record.messages.get(message.id)
+            if not mirror:
+                return
+            channel_id, message_id = mirror
+            try:
+                # recent copies are usually still in the bot's message cache
+                rifted = discord.utils.get(self.bot.cached_messages, id=message_id)
+                if not rifted:
+                    channel = self.bot.get_channel(channel_id)
+                    if not channel:
+                        return
+                    rifted = await channel.fetch_message(message_id)
+                await self.process_message(rift, message, rifted, spool)
+            except (discord.NotFound, RiftError):
+                pass
+            except Exception:
+                log.exception("Failed to edit the relayed copy of message %s", message.id)
+
+    async def delete_mirror(self, ticket, rift, message, deleted):
+        async with ticket:
+            record = self.open_rifts.get(rift)
+            mirror = record and record.messages.pop(message.id)
+            if not mirror or mirror in deleted:
+                return
+            deleted.add(mirror)
+            try:
+                await self.bot.http.delete_message(*mirror)
+            except discord.NotFound:
+                pass
+            except Exception:
+                log.exception("Failed to delete the relayed copy of message %s", message.id)
 
     def xbytes(self, b):
         blist = ("B", "KB", "MB")
@@ -335,58 +457,183 @@ class Rift(Cog):
         if m.author.bot:
             return
         channel = m.author if isinstance(m.channel, discord.DMChannel) else m.channel
-        sent = {}
-        is_command = (await self.bot.get_context(m)).valid
-        for rift, record in self.open_rifts.copy().items():
+        self.rehydrate(channel)
+        rifts = self.open_rifts.connected(channel)
+        if not rifts:
+            return
+        # each destination's place in line is claimed before anything is awaited,
+        # so every destination gets messages in the order they were sent
+        closing, relays, replies = [], [], {}
+        for rift in rifts:
             if rift.source == channel and rift.author == m.author:
                 if m.content.lower() == "exit":
-                    processed = self.open_rifts.pop(rift)
-                    if processed["notify"]:
-                        with suppress(discord.HTTPException):
-                            await rift.destination.send(
-                                _("{} has closed the rift.").format(m.author)
-                            )
-                    await channel.send(_("Rift closed."))
+                    closing.append(rift)
                 else:
-                    if not is_command:
-                        try:
-                            record[m] = await self.process_message(rift, m, rift.destination)
-                        except discord.HTTPException as e:
-                            await channel.send(
-                                _("I couldn't send your message due to an error: {}").format(e)
-                            )
+                    relays.append((rift, self.lanes.reserve(rift.destination.id)))
             elif rift.destination == channel:
                 rift_chans = (rift.source, rift.destination)
-                if rift_chans in sent:
-                    record[m] = sent[rift_chans]
-                else:
-                    record[m] = sent[rift_chans] = await self.process_message(rift, m, rift.source)
+                if rift_chans not in replies:
+                    replies[rift_chans] = (self.lanes.reserve(rift.source.id), [])
+                replies[rift_chans][1].append(rift)
+        tickets = [ticket for rift, ticket in relays]
+        tickets.extend(ticket for ticket, shared in replies.values())
+        # attachments are downloaded once, by whichever destination needs them first
+        spool = self.spool(m)
+        try:
+            if (await self.bot.get_context(m)).valid:
+                relays = []
+            closed = []
+            for rift in closing:
+                record = self.open_rifts.pop(rift, None)
+                if record is not None:
+                    closed.append((rift, record))
+            if closed:
+                await self.save_rifts()
+            for rift, record in closed:
+                if record.notify:
+                    with suppress(discord.HTTPException):
+                        await rift.destination.send(_("{} has closed the rift.").format(m.author))
+                await channel.send(_("Rift closed."))
+            await asyncio.gather(
+                *(
+                    self.relay(ticket, m, [rift], rift.destination, spool, report_to=channel)
+                    for rift, ticket in relays
+                ),
+                *(
+                    self.relay(ticket, m, shared, shared[0].source, spool)
+                    for ticket, shared in replies.values()
+                ),
+            )
+        finally:
+            spool.close()
+            # a skipped or failed relay mustn't hold up the messages behind it
+            for ticket in tickets:
+                ticket.release()
 
     @listener()
     async def on_message_delete(self, m):
         if m.author.bot:
             return
+        channel = m.author if isinstance(m.channel, discord.DMChannel) else m.channel
+        self.rehydrate(channel)
         deleted = set()
-        for record in self.open_rifts.copy().values():
-            with suppress(KeyError, discord.NotFound):
-                rifted = record.pop(m)
-                if rifted not in deleted:
-                    deleted.add(rifted)
-                    await rifted.delete()
+        deletes = []
+        for rift in self.open_rifts.connected(channel):
+            other = rift.destination if rift.source == channel else rift.source
+            deletes.append(self.delete_mirror(self.lanes.reserve(other.id), rift, m, deleted))
+        await asyncio.gather(*deletes)
 
     @listener()
     async def on_message_edit(self, b, a):
         if a.author.bot:
             return
         channel = a.author if isinstance(a.channel, discord.DMChannel) else a.channel
+        self.rehydrate(channel)
         sent = set()
-        for rift, record in self.open_rifts.copy().items():
+        edits = []
+        spool = self.spool(a)
+        for rift in self.open_rifts.connected(channel):
             if rift.source == channel and rift.author == a.author:
-                with suppress(KeyError, discord.NotFound):
-                    await self.process_message(rift, a, record[a])
+                ticket = self.lanes.reserve(rift.destination.id)
+                edits.append(self.edit_mirror(ticket, rift, a, spool))
             elif rift.destination == channel:
                 rift_chans = (rift.source, rift.destination)
                 if rift_chans not in sent:
                     sent.add(rift_chans)
-                    with suppress(KeyError, discord.NotFound):
-                        await self.process_message(rift, a, record[a])
+                    ticket = self.lanes.reserve(rift.source.id)
+                    edits.append(self.edit_mirror(ticket, rift, a, spool))
+        try:
+            await asyncio.gather(*edits)
+        finally:
+            spool.close()
+
+    # destination index and permission cache upkeep;
+    # the index has nothing to do until the first search builds it
+
+    @listener()
+    async def on_guild_join(self, guild):
+        if self.destinations.built:
+            self.destinations.add_guild(guild)
+
+    @listener()
+    async def on_guild_available(self, guild):
+        if self.destinations.built:
+            self.destinations.add_guild(guild)
+
+    @listener()
+    async def on_guild_remove(self, guild):
+        self.perms.forget_guild(guild.id)
+        if self.destinations.built:
+            self.destinations.remove_guild(guild)
+        if self.pending.drop(*(channel.id for channel in guild.channels)):
+            await self.save_rifts()
+
+    @listener()
+    async def on_guild_update(self, before, after):
+        # ownership changes what the owner can do everywhere
+        if before.owner_id != after.owner_id:
+            self.perms.forget_guild(after.id)
+
+    @listener()
+    async def on_guild_role_create(self, role):
+        self.perms.forget_guild(role.guild.id)
+
+    @listener()
+    async def on_guild_role_delete(self, role):
+        self.perms.forget_guild(role.guild.id)
+
+    @listener()
+    async def on_guild_role_update(self, before, after):
+        self.perms.forget_guild(after.guild.id)
+
+    @listener()
+    async def on_guild_channel_create(self, channel):
+        if self.destinations.built and isinstance(channel, discord.TextChannel):
+            self.destinations.add_channel(channel)
+
+    @listener()
+    async def on_guild_channel_delete(self, channel):
+        self.perms.forget_channel(channel.guild.id, channel.id)
+        if self.destinations.built and isinstance(channel, discord.TextChannel):
+            self.destinations.remove_channel(channel)
+        if self.pending.drop(channel.id):
+            await self.save_rifts()
+
+    @listener()
+    async def on_guild_channel_update(self, before, after):
+        if before.overwrites != after.overwrites:
+            self.perms.forget_channel(after.guild.id, after.id)
+            # synced channels take their category's overwrites
+            if isinstance(after, discord.CategoryChannel):
+                for channel in after.channels:
+                    self.perms.forget_channel(after.guild.id, channel.id)
+        if self.destinations.built and isinstance(after, discord.TextChannel):
+            if before.name != after.name:
+                self.destinations.remove_channel(before)
+                self.destinations.add_channel(after)
+
+    @listener()
+    async def on_member_join(self, member):
+        # non-members were given @everyone's permissions
+        self.perms.forget_member(member.guild.id, member.id)
+        if self.destinations.built:
+            self.destinations.add_member(member)
+
+    @listener()
+    async def on_member_remove(self, member):
+        self.perms.forget_member(member.guild.id, member.id)
+        if self.destinations.built:
+            self.destinations.remove_member(member)
+
+    @listener()
+    async def on_member_update(self, before, after):
+        if before.roles != after.roles:
+            self.perms.forget_member(after.guild.id, after.id)
+        if self.destinations.built and before.display_name != after.display_name:
+            self.destinations.remove_member(before)
+            self.destinations.add_member(after)
+
+    @listener()
+    async def on_user_update(self, before, after):
+        if self.destinations.built:
+            self.destinations.update_user(before, after)
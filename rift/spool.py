@@ -0,0 +1,132 @@
+import asyncio
+import io
+import logging
+import threading
+from tempfile import SpooledTemporaryFile
+from typing import List, Optional, Sequence, Tuple
+
+import aiohttp
+import discord
+
+
+log = logging.getLogger("red.fluffy.rift.spool")
+
+CHUNK_SIZE = 1 << 16
+# files bigger than this are written to disk instead of held in memory
+SPOOL_SIZE = 1 << 20
+
+
+class SpoolView(io.RawIOBase):
+    """
+    A read-only window onto a shared spooled file, with a position of its own.
+
+    Closing it leaves the file open, so ``discord.File`` can close its view
+    after uploading without taking the download away from other destinations.
+    Uploads may read from an executor thread, hence the lock.
+    """
+
+    def __init__(self, buffer, lock: threading.Lock, size: int):
+        super().__init__()
+        self._buffer = buffer
+        self._lock = lock
+        self._size = size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if self.closed:
+            raise ValueError("seek of closed file")
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._position = max(0, offset)
+        return self._position
+
+    def readinto(self, b) -> int:
+        if self.closed:
+            raise ValueError("read of closed file")
+        with self._lock:
+            self._buffer.seek(self._position)
+            data = self._buffer.read(len(b))
+        b[: len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+class AttachmentSpool:
+    """
+    A message's attachments, downloaded at most once however many destinations it's relayed to.
+
+    Attachments are streamed into spooled temporary files in order until ``max_size``
+    would be exceeded; the rest are left to be linked instead. Nothing is downloaded
+    until a destination asks for the files.
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        attachments: Sequence[discord.Attachment],
+        max_size: int,
+    ):
+        self.session = session
+        self.attachments = attachments
+        self.max_size = max_size
+        self._lock = asyncio.Lock()
+        self._read_lock = threading.Lock()
+        self._saved: Optional[List[Tuple[discord.Attachment, SpooledTemporaryFile, int]]] = None
+        self._skipped: List[discord.Attachment] = []
+
+    async def files(self) -> Tuple[List[discord.File], List[discord.Attachment]]:
+        """Fresh ``discord.File``s for one destination, and the attachments that didn't fit."""
+        async with self._lock:
+            if self._saved is None:
+                await self._download()
+        files = [
+            discord.File(SpoolView(buffer, self._read_lock, size), attachment.filename)
+            for attachment, buffer, size in self._saved
+        ]
+        return files, list(self._skipped)
+
+    async def _download(self):
+        self._saved = []
+        total = 0
+        for attachment in self.attachments:
+            if total + attachment.size > self.max_size:
+                log.debug("Attachment %r would exceed file size limits", attachment.filename)
+                self._skipped.append(attachment)
+                continue
+            buffer = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+            try:
+                size = await self._stream(attachment, buffer, self.max_size - total)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                log.debug("Could not download attachment %r: %s", attachment.filename, e)
+                buffer.close()
+                self._skipped.append(attachment)
+                continue
+            total += size
+            self._saved.append((attachment, buffer, size))
+
+    async def _stream(self, attachment: discord.Attachment, buffer, budget: int) -> int:
+        size = 0
+        async with self.session.get(attachment.url) as response:
+            response.raise_for_status()
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                size += len(chunk)
+                if size > budget:
+                    raise ValueError("larger than its stated size allows")
+                buffer.write(chunk)
+        return size
+
+    def close(self):
+        for attachment, buffer, size in self._saved or ():
+            buffer.close()
+        self._saved = None